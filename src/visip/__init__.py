@@ -4,6 +4,8 @@ Public names are:
 
 Decorators: workflow, analysis, action, Class
 
+compile - compile a static workflow into a flat execution plan for fast repeated runs
+
 wrapped actions:
     list, tuple, dict, ...
 
@@ -13,8 +15,11 @@ All underscored names are private
 # def decorators
 from .code.decorators import workflow, analysis, action_def, Class, Enum
 
+# fast repeated runs
+from .dev.plan import compile
+
 # builtin
-from .action.wrapped import list, dict, tuple, If #, partial
+from .action.wrapped import list, dict, tuple, If, batch_map, foreach, While, reduce, partial
 
 
 # std
@@ -11,8 +11,11 @@ class Value(_ActionBase):
     def __init__(self, value):
         super().__init__()
         self.value = value
+        self.fusible = True
 
     def action_hash(self):
+        if isinstance(self.value, _ActionBase):
+            return self.value.action_hash()
         return data.hash(self.value)
 
     def _evaluate(self) -> typing.Any:
@@ -28,6 +31,7 @@ class Pass(_ActionBase):
     """
     def __init__(self):
         super().__init__()
+        self.fusible = True
 
     def _evaluate(self, input: dtype.DataType):
         return input
@@ -46,6 +50,7 @@ class _ListBase(_ActionBase):
 
     def __init__(self, action_name):
         super().__init__(action_name)
+        self.fusible = True
         self._parameters = Parameters()
         self._parameters.append(
             ActionParameter(name=None, type=typing.Any,
@@ -82,6 +87,7 @@ class A_tuple(_ListBase):
 class A_dict(_ActionBase):
     def __init__(self):
         super().__init__(action_name='dict')
+        self.fusible = True
         self._parameters = Parameters()
         self._parameters.append(
             ActionParameter(name=None, type=typing.Tuple[typing.Any, typing.Any],
@@ -180,3 +186,4 @@ class ClassActionBase(_ActionBase):
         for param in self.parameters:
             a_hash = data.hash(param.name, previous=a_hash)
             a_hash = data.hash(param.name, previous=a_hash)
+        return a_hash
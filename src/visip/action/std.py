@@ -40,7 +40,7 @@ class ExecResult(dtype.DataClassBase):
     stderr: str
 
 
-@decorators.action_def
+@decorators.action_def(volatile=True)
 def file_in(path: str, workspace: Folder = "") -> FileIn:
     # we assume to be in the root of the VISIP workspace
     full_path = os.path.abspath(os.path.join(workspace, path))
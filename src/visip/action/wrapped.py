@@ -13,4 +13,8 @@ dict = wrap.public_action(constructor.A_dict())
 list = wrap.public_action(constructor.A_list())
 tuple = wrap.public_action(constructor.A_tuple())
 If = wrap.public_action(meta._If())
-#partial = wrap.public_action(meta.Partial())
\ No newline at end of file
+batch_map = wrap.public_action(meta._BatchMap())
+foreach = wrap.public_action(meta._ForEach())
+While = wrap.public_action(meta.While())
+reduce = wrap.public_action(meta._Reduce())
+partial = wrap.public_action(meta.Partial())
\ No newline at end of file
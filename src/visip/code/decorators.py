@@ -1,5 +1,6 @@
 import enum
 import inspect
+import importlib
 from ..code import dummy, wrap
 from ..dev import base
 from ..dev import action_workflow as wf
@@ -95,15 +96,51 @@ def Enum(enum_cls):
     return int_enum_cls
 
 
-def action_def(func):
+def _action_from_wrapper(module_name, name):
+    # Unpickle the action through the wrapper defined in the module.
+    return getattr(importlib.import_module(module_name), name).action
+
+
+class _FunctionAction(base._ActionBase):
+    """
+    Action made from a function by 'action_def'.
+    """
+    def __reduce_ex__(self, protocol):
+        # The module attribute of a module level function is the wrapper, pickle the action by reference
+        # through the wrapper, e.g. to evaluate the action in other process.
+        func = self._evaluate
+        if func.__qualname__ == func.__name__:
+            return _action_from_wrapper, (func.__module__, func.__name__)
+        return super().__reduce_ex__(protocol)
+
+
+def action_def(func=None, vectorized: bool = False, associative: bool = False, volatile: bool = False):
     """
     Decorator to make an action class from the evaluate function.
     Action name is given by the nama of the function.
     Input types are given by the type hints of the function params.
+
+    Usage:
+    @action_def
+    def action(...)
+
+    @action_def(vectorized=True)
+    def action(...)
+    The vectorized function accepts arrays of stacked inputs of many calls (along the first axis)
+    and returns an array of their results, see 'batch_map'.
+    The associative binary function is reduced in parallel, see 'reduce'.
+    The volatile function returns references to files (FileIn), its cached result is used only if the files
+    are unchanged and the result is hashed by the value, see _ActionBase.volatile.
     """
+    if func is None:
+        return lambda f: action_def(f, vectorized=vectorized, associative=associative, volatile=volatile)
     action_name = func.__name__
-    action = base._ActionBase(action_name)
+    action = _FunctionAction(action_name)
     action._evaluate = func
+    action.vectorized = vectorized
+    action.associative = associative
+    action.volatile = volatile
+    action.rehash_result = volatile
     action._extract_input_type()
     return wrap.public_action(action)
 
@@ -90,6 +90,8 @@ class _Workflow(meta.MetaAction):
       and stored in correct order in self._sorted_calls.
     - action_calls can be freely renamed as workflow makes name -> action_call dict only temporally
       (the. name_to_action_call property)
+    - expansion uses a cached plan compiled from self._sorted_calls, every edit of the workflow
+      must call 'update' or 'update_parameters' in order to invalidate it.
     """
 
     def __init__(self, name):
@@ -112,6 +114,10 @@ class _Workflow(meta.MetaAction):
         # Dict:  unique action instance name -> action instance.
         self._sorted_calls = []
         # topologically sorted action instance names
+        self._version = 0
+        # Incremented by every edit of the workflow.
+        self._compiled = None
+        # Expansion plan of the current version, see '_compile'.
 
         self.update_parameters()
 
@@ -150,6 +156,7 @@ class _Workflow(meta.MetaAction):
         :param result_instance: the result action
         :return: True in the case of sucessfull update, False - detected cycle
         """
+        self._invalidate()
         result_instance = self._result_call
         actions = set()
         topology_sort = []
@@ -200,6 +207,31 @@ class _Workflow(meta.MetaAction):
     # def evaluate(self, input):
     #     pass
 
+    @property
+    def version(self):
+        return self._version
+
+    def _invalidate(self):
+        self._version += 1
+        self._compiled = None
+
+    def _compile(self):
+        """
+        Make the expansion plan: list of (action_call, argument indices) in topological order, slots excluded.
+        Argument indices refer to the list of the workflow tasks: the slots (i.e. heads of the composed task)
+        followed by the tasks of the plan.
+        """
+        index = {slot: i for i, slot in enumerate(self._slots)}
+        plan = []
+        for action_call in self._sorted_calls:
+            if isinstance(action_call, _SlotCall):
+                continue
+            arg_indices = tuple(index[arg.value] for arg in action_call.arguments)
+            index[action_call] = len(self._slots) + len(plan)
+            plan.append((action_call, arg_indices))
+        self._compiled = plan
+        return plan
+
 
 
     def dependencies(self):
@@ -387,6 +419,7 @@ class _Workflow(meta.MetaAction):
         Update outer interface: parameters and result_type according to slots and result actions.
         TODO: Check and set types.
         """
+        self._invalidate()
         self._parameters = Parameters()
         for i_param, slot in enumerate(self._slots):
             slot_expected_types = [a.arguments[i_arg].parameter.type  for a, i_arg in slot.output_actions]
@@ -407,22 +440,16 @@ class _Workflow(meta.MetaAction):
 
             In particular slots are named by corresponding parameter name and result task have name '__result__'
         """
-        self.update()
-        childs = {}
+        plan = self._compiled
+        if plan is None:
+            plan = self._compile()
         assert len(self._slots) == len(task.inputs)
-        for slot, input in zip(self._slots, task.inputs):
-            # shortcut the slots
-            #task = task_creator(slot.name, Pass(), [input])
-            childs[slot.name] = input
-        for action_call in self._sorted_calls:
-            if isinstance(action_call, _SlotCall):
-                continue
-            # TODO: eliminate dict usage, assign a call rank to the action calls
-            # TODO: use it to index tasks in the resulting task list 'childs'
-            arg_tasks = [childs[arg.value.name] for arg in action_call.arguments]
-            task = task_creator(action_call.name, action_call.action, arg_tasks)
-            childs[action_call.name] = task
-        return childs.values()
+        # Slots are shortcut to the heads of the task.
+        childs = list(task.inputs)
+        for action_call, arg_indices in plan:
+            arg_tasks = [childs[i] for i in arg_indices]
+            childs.append(task_creator(action_call.name, action_call.action, arg_tasks))
+        return childs
 
 
 
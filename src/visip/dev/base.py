@@ -45,6 +45,23 @@ class _ActionBase:
     def __init__(self, action_name = None):
         self.task_type = TaskType.Atomic
         self.is_analysis = False
+        self.vectorized = False
+        # Evaluate accepts stacked inputs of many calls, see BatchMap.
+        self.associative = False
+        # Binary action f(f(a, b), c) == f(a, f(b, c)), Reduce combines in a balanced tree.
+        self.rehash_result = False
+        # Hash of the result is computed from its value instead of the action and its inputs.
+        # Consumers of a cheap action selecting a part of its input, e.g. a list item,
+        # then do not depend on the rest of the input.
+        self.tail_call = False
+        # Expanded composed task that is the result of another such task is bypassed,
+        # so that the chain of tasks of e.g. While iterations does not grow.
+        self.volatile = False
+        # Result depends on the content of the files it refers to (FileIn), a cached result is used only
+        # if the files are unchanged. The hash of the result is computed from its value.
+        self.fusible = False
+        # Cheap action (e.g. constant, list, item selection) evaluated in place as soon as its inputs are ready,
+        # out of the resources and the result cache, see Evaluation 'fuse_tasks'.
         self.name = action_name or self.__class__.__name__
         self.__visip_module__ = "visip"
         # Module where the action is defined.
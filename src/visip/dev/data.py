@@ -9,24 +9,47 @@ We SHOULD support:
 TODO:
 - use renamed jsondata lib for serialization and deserialization of the VISIP data
 - need support for numpy objects
-- use serialized object for hashing instead of its str repr.
-- use some serious hashing function
 
 Same special dataclasses are implemented, in particular:
 - file wrapper
 - ...
 """
-from typing import NewType
+from typing import NewType, Any, Optional, List
+import os
+import sys
+import enum
+import mmap
+import time
+import struct
 import pickle
+import sqlite3
 import hashlib
+import threading
+import collections
+import concurrent.futures
+import attr
+import numpy as np
 
 HashValue = NewType('HashValue', int)
 
-default_hash_fn = hash
-def my_hash(x, seed=0):
-    return default_hash_fn((x, seed))
+HASH_SIZE = 16
+# Size of the hash in bytes.
+
+def _new_hasher(previous: HashValue = 0):
+    """
+    Hash function used in whole analysis evaluation. BLAKE2b with 128 bit digest, it is
+    deterministic across processes and machines (unlike the builtin 'hash' salted by PYTHONHASHSEED).
+    The 'previous' hash is used as a prefix of the hashed stream in order to chain the hashes.
+    """
+    hasher = hashlib.blake2b(digest_size=HASH_SIZE)
+    if previous:
+        hasher.update(previous.to_bytes(HASH_SIZE, 'little'))
+    return hasher
+
+def _digest(hasher) -> HashValue:
+    return int.from_bytes(hasher.digest(), 'little')
+
 
-hasher_fn = my_hash
 def hash_stream(stream: bytearray, previous:HashValue=0) -> HashValue:
     """
     Compute the hash of the bytearray.
@@ -38,26 +61,386 @@ def hash_stream(stream: bytearray, previous:HashValue=0) -> HashValue:
     - input and result hashes
     - ResultsDB
     """
-    return hasher_fn(stream, seed=previous)
+    hasher = _new_hasher(previous)
+    hasher.update(stream)
+    return _digest(hasher)
+
+
+class _CanonicalHasher:
+    """
+    Feeds the hasher by a canonical serialization of a data tree.
+    Small items are collected in a buffer, large buffers (bytes, numpy arrays)
+    are passed to the hasher directly without copies.
+    Every item starts with a type tag, containers and variable size items contain their length.
+    """
+    _buffer_size = 1 << 16
+    _size = struct.Struct('<q')
+    _float = struct.Struct('<d')
+
+    def __init__(self, hasher):
+        self.hasher = hasher
+        self.buffer = bytearray()
+
+    def flush(self):
+        self.hasher.update(self.buffer)
+        self.buffer.clear()
+
+    def _write_size(self, tag: bytes, size: int):
+        self.buffer += tag
+        self.buffer += self._size.pack(size)
+
+    def _write_large(self, tag: bytes, buffer):
+        self._write_size(tag, buffer.nbytes)
+        self.flush()
+        self.hasher.update(buffer)
+
+    def _write_str(self, tag: bytes, string: str):
+        encoded = string.encode('utf-8')
+        self._write_size(tag, len(encoded))
+        self.buffer += encoded
+
+    def update(self, data: Any):
+        data_type = type(data)
+        buffer = self.buffer
+        if data_type is str:
+            self._write_str(b's', data)
+        elif data_type is float:
+            buffer += b'f'
+            buffer += self._float.pack(data)
+        elif data_type is int:
+            n_bytes = (data.bit_length() + 8) // 8
+            self._write_size(b'i', n_bytes)
+            buffer += data.to_bytes(n_bytes, 'little', signed=True)
+        elif data is None:
+            buffer += b'N'
+        elif data_type is bool:
+            buffer += b'T' if data else b'F'
+        elif data_type in (bytes, bytearray, memoryview):
+            self._write_large(b'b', memoryview(data))
+        elif data_type is list or data_type is tuple:
+            self._update_sequence(b'l' if data_type is list else b't', data)
+        elif data_type is dict:
+            self._update_dict(data)
+        elif data_type is set or data_type is frozenset:
+            self._update_unordered(b'e', data)
+        elif isinstance(data, np.ndarray):
+            self._update_array(data)
+        elif isinstance(data, np.generic):
+            self._write_str(b'g', data.dtype.str)
+            buffer += data.tobytes()
+        elif isinstance(data, enum.Enum):
+            self._write_str(b'n', data_type.__qualname__)
+            self.update(data.value)
+        elif attr.has(data_type):
+            self._write_str(b'c', "{}.{}".format(data_type.__module__, data_type.__qualname__))
+            for attribute in attr.fields(data_type):
+                self.update(getattr(data, attribute.name))
+        else:
+            self._update_other(data)
+        if len(buffer) > self._buffer_size:
+            self.flush()
+
+    def _update_sequence(self, tag, data):
+        self._write_size(tag, len(data))
+        if data and all(type(item) is float for item in data):
+            # Fast path for lists of floats, same stream as the items processed one by one.
+            n_items = len(data)
+            items = struct.pack('<' + n_items * 'cd', *(x for item in data for x in (b'f', item)))
+            self.buffer += items
+        else:
+            for item in data:
+                self.update(item)
+
+    def _update_dict(self, data):
+        if all(type(key) is str for key in data):
+            # Canonical order given by the sorted keys.
+            self._write_size(b'D', len(data))
+            for key in sorted(data):
+                self._write_str(b's', key)
+                self.update(data[key])
+        else:
+            self._update_unordered(b'd', data.items())
+
+    def _update_unordered(self, tag, items):
+        # Order of items is given by their hashes.
+        item_hashes = sorted(hash(item) for item in items)
+        self._write_size(tag, len(item_hashes))
+        for item_hash in item_hashes:
+            self.buffer += item_hash.to_bytes(HASH_SIZE, 'little')
+
+    def _update_array(self, array: np.ndarray):
+        self._write_str(b'a', array.dtype.str)
+        self._write_size(b'', array.ndim)
+        for dim in array.shape:
+            self._write_size(b'', dim)
+        if array.dtype.hasobject:
+            for item in array.flat:
+                self.update(item)
+        elif array.flags.c_contiguous:
+            self._write_large(b'', array.reshape(-1).view(np.uint8))
+        elif array.size > 0:
+            # Bounded copies of the non-contiguous array.
+            for block in np.nditer(array, flags=['external_loop', 'buffered', 'zerosize_ok'],
+                                   buffersize=self._buffer_size, order='C'):
+                self._write_large(b'', np.ascontiguousarray(block).view(np.uint8))
+
+    def _update_other(self, data):
+        try:
+            stream = pickle.dumps(data, protocol=4)
+        except Exception:
+            # Not picklable, e.g. local functions or objects with custom '__getattr__'.
+            stream = str(data).encode('utf-8')
+        self._write_large(b'o', memoryview(stream))
+
+
+def hash(data, previous=0) -> HashValue:
+    """
+    Deterministic 128 bit hash of a data tree.
+    Basic types, lists, tuples, dicts, sets, enums, attrs classes and numpy arrays are hashed
+    through their canonical serialization, other objects through their pickle (or str as the fallback).
+    """
+    hasher = _new_hasher(previous)
+    data_type = type(data)
+    # Fast paths for names and hashes, same stream as the _CanonicalHasher.
+    if data_type is str:
+        encoded = data.encode('utf-8')
+        hasher.update(b's' + _CanonicalHasher._size.pack(len(encoded)) + encoded)
+    elif data_type is int:
+        n_bytes = (data.bit_length() + 8) // 8
+        hasher.update(b'i' + _CanonicalHasher._size.pack(n_bytes) + data.to_bytes(n_bytes, 'little', signed=True))
+    else:
+        canonical = _CanonicalHasher(hasher)
+        canonical.update(data)
+        canonical.flush()
+    return _digest(hasher)
+
 
-def hash(data, previous=0):
-    return hash_stream(str(data), previous)
+def size_estimate(data, max_items: int = 64) -> int:
+    """
+    Estimate of the memory footprint of a data tree in bytes.
+    Numpy arrays and buffers are counted by their size, containers recursively.
+    Only the first 'max_items' items of large containers are inspected, the rest is extrapolated.
+    """
+    if isinstance(data, np.ndarray):
+        # Views are counted by their size too, they keep the base array alive.
+        return max(sys.getsizeof(data), data.nbytes)
+    if isinstance(data, (list, tuple, set, frozenset, dict)):
+        items = list(data.items()) if isinstance(data, dict) else data
+        size = sys.getsizeof(data)
+        n_items = len(items)
+        if n_items == 0:
+            return size
+        sample = [item for item, _ in zip(items, range(max_items))]
+        sample_size = sum(size_estimate(item, max_items) for item in sample)
+        return size + sample_size * n_items // len(sample)
+    if attr.has(type(data)):
+        return sys.getsizeof(data) + size_estimate(attr.astuple(data, recurse=False), max_items)
+    return sys.getsizeof(data)
 
 
 def hash_file(file_path):
-    # BUF_SIZE is totally arbitrary, change for your app!
-    BUF_SIZE = 65536  # lets read stuff in 64kb chunks!
-    sha1 = hashlib.sha1()
+    """
+    Hash of the file content. Hashes of unchanged files are taken from the default FileHashIndex.
+    """
+    index = file_hash_index()
+    if index is None:
+        return hash_file_content(file_path)
+    return index.hash_file(file_path)
 
+
+def hash_file_content(file_path) -> HashValue:
+    """
+    Read and hash the file, files of at least '_TREE_MIN_SIZE' are hashed in parallel by 'hash_file_tree'.
+    """
+    if os.path.getsize(file_path) >= _TREE_MIN_SIZE:
+        return hash_file_tree(file_path)
+    return hash_file_stream(file_path)
+
+
+_MMAP_CHUNK = 1 << 24
+# Size of the file chunks passed to the hasher at once. [bytes]
+
+def hash_file_stream(file_path) -> HashValue:
+    """
+    Hash of the file content, the file is read through 'mmap' without copies, large chunks
+    are hashed without holding the GIL.
+    """
+    sha1 = hashlib.sha1()
     with open(file_path, 'rb') as f:
-        while True:
-            data = f.read(BUF_SIZE)
-            if not data:
-                break
-            sha1.update(data)
+        size = os.fstat(f.fileno()).st_size
+        if size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as buffer:
+                    for begin in range(0, len(buffer), _MMAP_CHUNK):
+                        sha1.update(buffer[begin:begin + _MMAP_CHUNK])
     return hash(sha1.digest())
 
 
+_TREE_CHUNK = 1 << 26
+# Size of the leaf chunks of the tree hash. [bytes]
+_TREE_MIN_SIZE = 1 << 28
+# Minimal size of the files hashed by the tree hash. [bytes]
+
+_hash_pool = None
+# Pool of the threads hashing the file chunks shared by all calls, tuple (pid, executor).
+_hash_pool_lock = threading.Lock()
+
+def _hash_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _hash_pool
+    with _hash_pool_lock:
+        # The pool threads do not survive a fork.
+        if _hash_pool is None or _hash_pool[0] != os.getpid():
+            _hash_pool = (os.getpid(), concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1))
+        return _hash_pool[1]
+
+
+def file_chunk_digests(file_path, chunk_size: int = _TREE_CHUNK, n_threads: int = None) -> List[bytes]:
+    """
+    Digests of the consecutive chunks of the file, the leaves of the tree hash.
+    Chunks are hashed by the pool of threads shared by all calls (number of CPUs),
+    at most 'n_threads' chunks of the file at once (no limit by default), the file is read through 'mmap'.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return [hashlib.sha1(b'\x00').digest()]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as buffer:
+                def leaf(begin):
+                    # Leaves and nodes are distinguished by the prefix.
+                    sha1 = hashlib.sha1(b'\x00')
+                    end = min(begin + chunk_size, size)
+                    for part in range(begin, end, _MMAP_CHUNK):
+                        sha1.update(buffer[part:min(part + _MMAP_CHUNK, end)])
+                    return sha1.digest()
+
+                begins = range(0, size, chunk_size)
+                if n_threads == 1 or len(begins) == 1:
+                    return [leaf(begin) for begin in begins]
+                if n_threads is None:
+                    n_threads = len(begins)
+                executor = _hash_executor()
+                digests = []
+                futures = collections.deque()
+                try:
+                    for begin in begins:
+                        if len(futures) >= n_threads:
+                            digests.append(futures.popleft().result())
+                        futures.append(executor.submit(leaf, begin))
+                    digests.extend(future.result() for future in futures)
+                finally:
+                    # The buffer must not be used after it is closed.
+                    concurrent.futures.wait(futures)
+                return digests
+
+
+def merkle_root(digests: List[bytes], chunk_size: int = _TREE_CHUNK) -> HashValue:
+    """
+    Root of the binary Merkle tree over the chunk digests.
+    """
+    level = digests
+    while len(level) > 1:
+        level = [hashlib.sha1(b'\x01' + b''.join(level[i:i + 2])).digest() for i in range(0, len(level), 2)]
+    return hash(level[0], previous=hash(chunk_size))
+
+
+def hash_file_tree(file_path, chunk_size: int = _TREE_CHUNK, n_threads: int = None) -> HashValue:
+    """
+    Tree hash of the file, chunks are hashed in parallel, see 'file_chunk_digests'.
+    Differs from the 'hash_file_stream' of the same file.
+    """
+    return merkle_root(file_chunk_digests(file_path, chunk_size, n_threads), chunk_size)
+
+
+def changed_chunks(old_digests: List[bytes], new_digests: List[bytes]) -> List[int]:
+    """
+    Indices of the chunks that differ in two versions of the file given by their 'file_chunk_digests'.
+    """
+    n_common = min(len(old_digests), len(new_digests))
+    changed = [i for i in range(n_common) if old_digests[i] != new_digests[i]]
+    return changed + list(range(n_common, max(len(old_digests), len(new_digests))))
+
+
+def file_hash_scheme() -> str:
+    """
+    Identification of the 'hash_file_content' algorithm and its parameters.
+    """
+    return "sha1;tree_chunk={};tree_min_size={}".format(_TREE_CHUNK, _TREE_MIN_SIZE)
+
+
+class FileHashIndex:
+    """
+    Persistent index of the file hashes keyed by (device, inode, size, mtime_ns) and the hash scheme
+    (see 'file_hash_scheme'), so that unchanged files are not read again and the hashes of a different
+    algorithm are never used. The SQLite database can be shared by concurrent processes.
+
+    Files modified less then 'racy_time' before hashing are not indexed, as their later modification
+    may not change the modification time.
+    """
+    racy_time = 2.0
+    # [s]
+
+    def __init__(self, db_path: str, timeout: float = 60.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+        # Connection of the thread, SQLite connections can not be shared by threads nor forked processes.
+        self._connection().execute("CREATE TABLE IF NOT EXISTS files "
+                                   "(device INTEGER, inode INTEGER, scheme TEXT, size INTEGER, mtime_ns INTEGER, "
+                                   "hash BLOB, PRIMARY KEY (device, inode, scheme))")
+
+    def _connection(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    @staticmethod
+    def _key(file_stat):
+        # SQLite integers are signed 64 bit.
+        device, inode = [(i + (1 << 63)) % (1 << 64) - (1 << 63) for i in (file_stat.st_dev, file_stat.st_ino)]
+        return device, inode, file_stat.st_size, file_stat.st_mtime_ns
+
+    def hash_file(self, file_path) -> HashValue:
+        file_stat = os.stat(file_path)
+        key = self._key(file_stat)
+        scheme = file_hash_scheme()
+        db = self._connection()
+        row = db.execute("SELECT hash FROM files WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? "
+                         "AND scheme = ?", (*key, scheme)).fetchone()
+        if row is not None:
+            return int.from_bytes(row[0], 'little')
+        file_hash = hash_file_content(file_path)
+        if time.time() - file_stat.st_mtime > self.racy_time and self._key(os.stat(file_path)) == key:
+            db.execute("INSERT OR REPLACE INTO files (device, inode, size, mtime_ns, scheme, hash) "
+                       "VALUES (?, ?, ?, ?, ?, ?)", (*key, scheme, file_hash.to_bytes(HASH_SIZE, 'little')))
+        return file_hash
+
+
+_file_hash_index = None
+# The default index, created on the first use, False if not available.
+
+def file_hash_index() -> Optional[FileHashIndex]:
+    """
+    The default file hash index used by 'hash_file'. The index is opt-in, given by the path
+    in the environment variable VISIP_FILE_HASH_INDEX, e.g. '~/.cache/visip/file_hashes.sqlite'.
+    :return: None if the index is disabled or it can not be created.
+    """
+    global _file_hash_index
+    if _file_hash_index is None:
+        db_path = os.path.expanduser(os.environ.get('VISIP_FILE_HASH_INDEX', ''))
+        _file_hash_index = False
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                _file_hash_index = FileHashIndex(db_path)
+            except (OSError, sqlite3.Error):
+                pass
+    return _file_hash_index or None
+
+
 def serialize(data):
     """
     Serialize a data tree 'data' into a byte array.
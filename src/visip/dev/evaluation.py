@@ -11,21 +11,44 @@ Evaluation of a workflow.
 4. Tasks are assigned to the resources by scheduler,
 """
 import os
+import queue
+import pickle
+import asyncio
+import inspect
+import threading
+import concurrent.futures
 from typing import List, Dict, Tuple, Any, Union
 import attr
 import heapq
+import collections
 import numpy as np
 import time
 
 from . import data, task as task_mod, base, dfs,  dtype as dtype, action_instance as instance
 from .action_workflow import _Workflow
 from ..action.constructor import Value
-from ..eval.cache import ResultCache
+from ..eval.cache import ResultCache, BoundedResultCache, FileResultCache, SQLiteResultCache, TieredResultCache
+from ..eval.artifacts import ArtifactStore
 from ..code import wrap
 from ..code.dummy import Dummy
 from . import tools
 
 
+def _evaluate_action(evaluate_fn, inputs):
+    """
+    Call the evaluate function of an action.
+    The coroutine returned by an async action is run to completion in a new event loop.
+    """
+    result = evaluate_fn(inputs)
+    if inspect.isawaitable(result):
+        loop = asyncio.new_event_loop()
+        try:
+            result = loop.run_until_complete(result)
+        finally:
+            loop.close()
+    return result
+
+
 class Resource:
     """
     Model for a computational resource.
@@ -35,10 +58,15 @@ class Resource:
 
     We shall start with fixed number of resources, dynamic creation of executing PBS jobs can later be done.
 
+    The base resource evaluates the submitted tasks synchronously, i.e. directly in the 'submit' call.
     """
-    def __init__(self):
+    concurrent = False
+    # Tasks are evaluated asynchronously, i.e. the resource may run ahead of the ready tasks.
+
+    def __init__(self, cache: ResultCache = None):
         """
         Initialize time scaling and other features of the resource.
+        :param cache: Result cache to use, a new in-memory cache by default.
         """
         self.start_latency = 0.0
         # Average time from assignment to actual execution of the task. [seconds]
@@ -51,9 +79,15 @@ class Resource:
         self.n_mpi_proces = 0
         # Maximal number of MPI processes one can assign.
         self._finished = []
+        self.notify_finished = None
+        # Callback to notify the scheduler about finished tasks, called from any thread.
+        # Set by the Scheduler.
 
-
-        self.cache = ResultCache()
+        if cache is None:
+            cache = ResultCache()
+        self.cache = cache
+        self.artifacts: ArtifactStore = None
+        # Store of the result files, set by the Evaluation with 'artifacts'.
 
     # def assign_task(self, task, i_thread=None):
     #     """
@@ -67,6 +101,19 @@ class Resource:
     # def assign_mpi_task(self, task, n_mpi_procs=None):
     #     pass
 
+    @property
+    def n_running(self):
+        """
+        Number of submitted tasks that are not finished yet.
+        """
+        return 0
+
+    def can_accept(self):
+        """
+        True if the resource can accept a new task without exceeding its capacity.
+        """
+        return True
+
     def get_finished(self):
         """
         Return list of the tasks finished since the last call.
@@ -85,35 +132,280 @@ class Resource:
             task_hash = task.lazy_hash()
             # Check result cache
 
-            res_value = self.cache.value(task_hash)
+            res_value = self._cache_value(task_hash)
+            if res_value is not self.cache.NoValue and task.action.volatile and not self._files_unchanged(res_value):
+                res_value = self.cache.NoValue
             if res_value is self.cache.NoValue:
                 assert task.is_ready()
-                result = task.evaluate_fn()
-                data_inputs = [input.result for input in task.inputs]
-                res_value = result(data_inputs)
-                # print(task.action)
-                # print(task.inputs)
-                # print(task_hash, res_value)
-                self.cache.insert(task_hash, res_value)
+                self._evaluate(task, task_hash)
+            else:
+                self._finish(task, task_hash, res_value)
+
+    def _evaluate(self, task, task_hash):
+        """
+        Evaluate the task and finish it. Asynchronous resources override this method,
+        they have to call '_finish' once the result is available.
+        """
+        result = task.evaluate_fn()
+        data_inputs = [input.result for input in task.inputs]
+        start = time.perf_counter()
+        res_value = _evaluate_action(result, data_inputs)
+        self._cache_insert(task_hash, res_value, cost=time.perf_counter() - start)
+        self._finish(task, task_hash, res_value)
+
+    def _cache_value(self, task_hash):
+        # Cached result, the result files are restored, no value if they are lost.
+        res_value = self.cache.value(task_hash)
+        if res_value is not self.cache.NoValue and self.artifacts is not None \
+                and not self.artifacts.restore(res_value):
+            return self.cache.NoValue
+        return res_value
+
+    @staticmethod
+    def _files_unchanged(res_value):
+        # All files of the cached result exist and have the same content.
+        for file_in in ArtifactStore.file_ins(res_value):
+            if not os.path.isfile(file_in.path) or data.hash_file(file_in.path) != file_in.hash:
+                return False
+        return True
+
+    def _cache_insert(self, task_hash, res_value, cost=None):
+        self.cache.insert(task_hash, res_value, cost=cost)
+        if self.artifacts is not None:
+            self.artifacts.store(res_value)
+
+    def _finish(self, task, task_hash, res_value):
+        task.finish(result=res_value, task_hash=task_hash)
+        self._finished.append(task)
+
+    def _notify(self):
+        if self.notify_finished is not None:
+            self.notify_finished()
+
+    def close(self):
+        """
+        Release resources (threads, processes) used for the task evaluation.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _PoolResource(Resource):
+    """
+    Common base of the resources evaluating the tasks concurrently by
+    a 'concurrent.futures' executor. Tasks are submitted without blocking,
+    finished tasks are collected by 'get_finished'.
+    """
+    _executor_class = None
+    concurrent = True
+
+    def __init__(self, n_threads: int = None, cache: ResultCache = None):
+        """
+        :param n_threads: Number of concurrently evaluated tasks, number of CPUs by default.
+        :param cache: Result cache to use, a new in-memory cache by default.
+        """
+        super().__init__(cache)
+        if n_threads is None:
+            n_threads = os.cpu_count() or 1
+        self.n_threads = n_threads
+        self._executor = None
+        # Executor created on the first submitted task.
+        self._running = {}
+        # Map of running futures to the tuple (task, task_hash, submit time).
+        self._done = queue.Queue()
+        # Futures completed since the last 'get_finished' call, filled from the executor threads.
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = self._executor_class(max_workers=self.n_threads)
+        return self._executor
+
+    @property
+    def n_running(self):
+        return len(self._running)
+
+    def can_accept(self):
+        return len(self._running) < self.n_threads
+
+    def _evaluate(self, task, task_hash):
+        result = task.evaluate_fn()
+        data_inputs = [input.result for input in task.inputs]
+        future = self.executor.submit(_evaluate_action, result, data_inputs)
+        self._add_running(future, task, task_hash)
+
+    def _add_running(self, future, task, task_hash):
+        task.status = task_mod.Status.running
+        self._running[future] = (task, task_hash, time.perf_counter())
+        future.add_done_callback(self._future_done)
+
+    def _future_done(self, future):
+        self._done.put(future)
+        self._notify()
+
+    def get_finished(self):
+        while not self._done.empty():
+            future = self._done.get()
+            task, task_hash, start = self._running.pop(future)
+            # Reraise the exception of the action.
+            res_value = future.result()
+            self._cache_insert(task_hash, res_value, cost=time.perf_counter() - start)
+            self._finish(task, task_hash, res_value)
+        return super().get_finished()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class ThreadPoolResource(_PoolResource):
+    """
+    Evaluates tasks in a pool of threads.
+    Suitable for the actions releasing GIL, in particular the 'system' calls and I/O.
+    """
+    _executor_class = concurrent.futures.ThreadPoolExecutor
+
+
+class ProcessPoolResource(_PoolResource):
+    """
+    Evaluates tasks in a pool of processes.
+    Actions and their input and output data must be picklable. Auxiliary tasks
+    (composed tasks and their heads) just pass their input and are evaluated in place.
+    """
+    _executor_class = concurrent.futures.ProcessPoolExecutor
+
+    def _evaluate(self, task, task_hash):
+        if type(task) is task_mod.Atomic:
+            super()._evaluate(task, task_hash)
+        else:
+            Resource._evaluate(self, task, task_hash)
+
+
+
+
+
+class AsyncioResource(_PoolResource):
+    """
+    Evaluates tasks on the running asyncio event loop. Coroutines of the async actions
+    run concurrently as loop tasks, other actions are evaluated in the pool of threads
+    by 'run_in_executor', so they do not block the loop. Cheap actions (see _ActionBase.fusible)
+    and auxiliary tasks are evaluated in place.
+    Used by 'Evaluation.execute_async'.
+    """
+    _executor_class = concurrent.futures.ThreadPoolExecutor
+
+    def __init__(self, max_in_flight: int = 10000, n_threads: int = None, cache: ResultCache = None):
+        """
+        :param max_in_flight: Maximal number of running tasks (coroutines and actions in the pool).
+        :param n_threads: Number of threads evaluating the synchronous actions, number of CPUs by default.
+        """
+        super().__init__(n_threads, cache)
+        self.max_in_flight = max_in_flight
+
+    def can_accept(self):
+        return len(self._running) < self.max_in_flight
+
+    def _evaluate(self, task, task_hash):
+        result = task.evaluate_fn()
+        data_inputs = [input.result for input in task.inputs]
+        if type(task) is task_mod.Atomic and asyncio.iscoroutinefunction(task.action._evaluate):
+            self._add_running(asyncio.ensure_future(result(data_inputs)), task, task_hash)
+        elif type(task) is task_mod.Atomic and not task.action.fusible:
+            loop = asyncio.get_event_loop()
+            future = loop.run_in_executor(self.executor, _evaluate_action, result, data_inputs)
+            self._add_running(future, task, task_hash)
+        else:
+            start = time.perf_counter()
+            res_value = _evaluate_action(result, data_inputs)
+            self._cache_insert(task_hash, res_value, cost=time.perf_counter() - start)
+            self._finish(task, task_hash, res_value)
+
+
+class SchedulingPolicy:
+    """
+    Order of the ready tasks in the Scheduler. Tasks with smaller key are submitted first,
+    ties are broken by the order in which the tasks were pushed to the ready queue.
+    The base policy is FIFO.
+    The key is evaluated once, when the task is pushed to the ready queue.
+    """
+    def key(self, task: task_mod._TaskBase):
+        return 0
 
-            task.finish(result=res_value, task_hash=task_hash)
-            self._finished.append(task)
 
+class FIFOPolicy(SchedulingPolicy):
+    pass
 
 
+class LIFOPolicy(SchedulingPolicy):
+    """
+    Last pushed first, i.e. the consumers of just finished tasks are preferred (depth first traversal).
+    Keeps the number of results waiting for their consumers small, e.g. in the Reduce tree.
+    """
+    def __init__(self):
+        self._n_pushed = 0
 
+    def key(self, task):
+        self._n_pushed += 1
+        return -self._n_pushed
+
+
+class CriticalPathPolicy(SchedulingPolicy):
+    """
+    Longest remaining path first, i.e. the tasks on the critical path
+    (task.critical_path computed by Scheduler.optimize) are preferred.
+    """
+    def key(self, task):
+        return -task.critical_path
+
+
+class SlackPolicy(SchedulingPolicy):
+    """
+    Smallest slack first. The slack is: makespan - (start_time + critical_path),
+    the makespan is common to all tasks.
+    """
+    def key(self, task):
+        return -(task.start_time + task.critical_path)
+
+
+class LPTPolicy(SchedulingPolicy):
+    """
+    Longest processing time (task.eval_time) first.
+    """
+    def key(self, task):
+        return -task.eval_time
+
+
+class UserPriorityPolicy(SchedulingPolicy):
+    """
+    Priority given by the user function: priority_fn(task) -> float, tasks with higher priority first.
+    """
+    def __init__(self, priority_fn):
+        self.priority_fn = priority_fn
+
+    def key(self, task):
+        return -self.priority_fn(task)
 
 
 class Scheduler:
-    def __init__(self, resources:Resource, n_tasks_limit:int = 1024):
+    def __init__(self, resources:Resource, n_tasks_limit:int = 1024, policy: SchedulingPolicy = None):
         """
         :param tasks_dag: Tasks to be evaluated.
+        :param policy: Order of the ready tasks, CriticalPathPolicy by default.
         """
         self.resources = resources
         # Dict of available resources
         self.n_tasks_limit = n_tasks_limit
         # When number of assigned (and unprocessed) tasks is over the limit we do not accept
         # further DAG expansion.
+        if policy is None:
+            policy = CriticalPathPolicy()
+        self.policy = policy
 
         self.tasks = {}
         # all not yet sumitted tasks, vertices of the DAG that is optimized by the scheduler
@@ -121,46 +413,146 @@ class Scheduler:
 
         self._ready_queue = []
         # Priority queue of the 'ready' tasks.  Used to submit the ready tasks without
-        # whole DAG optimization. Priority is the
+        # whole DAG optimization. Items are tuples (policy key, push index, task).
+        self._n_pushed = 0
+        # Number of pushed tasks, used to break ties in the ready queue.
+        self._deferred = []
+        # Ready tasks with only lazy consumers (see _TaskBase.is_deferred), pushed again by every update.
+        self._fused = {}
+        # Fused tasks waiting for their inputs, see 'fuse'. Maps task ID to the task.
+        self._fused_finished = []
+        # Fused tasks finished out of 'update', returned by the next 'update'.
+
+        self.max_wait = 1.0
+        # Maximal time to wait for a finished task, a fallback for resources without notification. [seconds]
+        self._finished_event = threading.Event()
+        # Set by the resources when a task is finished.
+        self._async_event = None
+        # Tuple (loop, asyncio.Event) used by 'wait_async'.
+        for resource in self.resources:
+            resource.notify_finished = self.notify_finished
 
         self._start_time = time.perf_counter()
         # Start time of the DAG evaluation.
 
-        self._topology_sort = []
-        # Topological sort of the tasks.
+        self._new_tasks = {}
+        # Tasks appended since the last 'optimize' call, i.e. new tasks or tasks with changed inputs.
 
-    def can_expand(self):
-        return self.n_assigned_tasks < self.n_tasks_limit
+    def can_expand(self, n_new: int = 0):
+        """
+        :param n_new: Number of new tasks not appended yet.
+        """
+        return self.n_assigned_tasks + n_new < self.n_tasks_limit
     @property
     def n_assigned_tasks(self):
         return len(self.tasks)
 
+    @property
+    def n_running_tasks(self):
+        """
+        Number of submitted tasks, that are not finished yet.
+        """
+        return sum(resource.n_running for resource in self.resources)
+
     def get_time(self):
         return time.perf_counter() - self._start_time
 
+    def notify_finished(self):
+        """
+        Called by the resources (from any thread) when a task is finished.
+        """
+        self._finished_event.set()
+        if self._async_event is not None:
+            loop, event = self._async_event
+            loop.call_soon_threadsafe(event.set)
+
+    def wait(self, timeout: float = None):
+        """
+        Block until a resource finishes a task or 'timeout' (self.max_wait by default) expires.
+        Finished tasks are collected by the next 'update'.
+        """
+        if timeout is None:
+            timeout = self.max_wait
+        self._finished_event.wait(timeout)
+        self._finished_event.clear()
+
+    async def wait_async(self, timeout: float = None):
+        """
+        Same as 'wait' but do not block the event loop.
+        """
+        if timeout is None:
+            timeout = self.max_wait
+        loop = asyncio.get_event_loop()
+        if self._async_event is None or self._async_event[0] is not loop:
+            self._async_event = (loop, asyncio.Event())
+        event = self._async_event[1]
+        # Notification before the event was created.
+        if not self._finished_event.is_set():
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        event.clear()
+        self._finished_event.clear()
+
     def append(self, tasks):
         """
         Add more tasks of the same DAG to be scheduled to the resources,
         :param tasks: All tasks that are new or have changed inputs.
         :return: List of composed tasks to expand. If empty the optimization should be called.
         """
-        self.tasks.update({ t.id: t for t in tasks})
+        new_tasks = { t.id: t for t in tasks}
+        self.tasks.update(new_tasks)
+        self._new_tasks.update(new_tasks)
+
+    def fuse(self, tasks):
+        """
+        Add cheap tasks (see _ActionBase.fusible) evaluated in place as soon as they are ready,
+        i.e. fused with the task finishing their last input. Chains of fused tasks are evaluated at once.
+        Fused tasks bypass the ready queue, the resources and the result cache.
+        """
+        for task in tasks:
+            self._fused[task.id] = task
+        for task in tasks:
+            if task.id in self._fused and task.is_ready():
+                self._evaluate_fused(task)
+                self._fused_finished.append(task)
+                self._push_consumers(task, self._fused_finished)
+
+    def _evaluate_fused(self, task):
+        del self._fused[task.id]
+        inputs = [input.result for input in task.inputs]
+        task.finish(task.evaluate_fn()(inputs), task.lazy_hash())
+
+    def _push_consumers(self, task, finished):
+        # Push consumers of the finished task to the ready queue, evaluate the ready fused consumers.
+        stack = [task]
+        while stack:
+            task = stack.pop()
+            for dep_task in task.outputs:
+                if dep_task.id not in self._fused:
+                    self.ready_queue_push(dep_task)
+                elif dep_task.is_ready():
+                    self._evaluate_fused(dep_task)
+                    finished.append(dep_task)
+                    stack.append(dep_task)
 
     def ready_queue_push(self, task):
-        if task.is_ready():
-            heapq.heappush(self._ready_queue, task)
+        # Tasks not processed by 'optimize' yet are pushed there.
+        if task.resource_id is not None and task.is_ready():
+            heapq.heappush(self._ready_queue, (self.policy.key(task), self._n_pushed, task))
+            self._n_pushed += 1
 
 
 
     def _collect_finished(self):
         # collect finished tasks, update ready queue
-        finished = []
+        finished, self._fused_finished = self._fused_finished, []
         for resource in self.resources:
             new_finished = resource.get_finished()
-            for task in new_finished:
-                for dep_task in task.outputs:
-                    self.ready_queue_push(dep_task)
             finished.extend(new_finished)
+            for task in new_finished:
+                self._push_consumers(task, finished)
         return finished
 
 
@@ -168,43 +560,137 @@ class Scheduler:
         """
         Update resources, collect finished tasks, submit new ready tasks.
         Should be called approximately every 'call_period' seconds.
+        Ready tasks are submitted as long as their resource can accept them,
+        the remaining tasks wait in the ready queue for the next update.
         """
         finished = self._collect_finished()
+        deferred, self._deferred = self._deferred, []
+        for task in deferred:
+            self.ready_queue_push(task)
         while self._ready_queue:
-            task = heapq.heappop(self._ready_queue)
-            if task.id in self.tasks:   # deal with duplicate entrieas in the queue
-                self.resources[task.resource_id].submit(task)
-                del self.tasks[task.id]
+            task = self._ready_queue[0][-1]
+            if task.id not in self.tasks:   # deal with duplicate entrieas in the queue
+                heapq.heappop(self._ready_queue)
+                continue
+            resource = self.resources[task.resource_id]
+            if not resource.can_accept():
+                break
+            heapq.heappop(self._ready_queue)
+            if task.is_deferred():
+                self._deferred.append(task)
+                continue
+            del self.tasks[task.id]
+            resource.submit(task)
         return finished
 
+    def is_idle(self):
+        """
+        True if no ready task is waiting and all resources evaluate concurrently and can accept more tasks.
+        A synchronous resource is never idle, it has no spare capacity for speculative tasks.
+        """
+        if any(task.id in self.tasks for _, _, task in self._ready_queue):
+            return False
+        return all(resource.concurrent and resource.can_accept() for resource in self.resources)
+
+    def remove(self, task):
+        """
+        Remove a task that is not submitted, e.g. a cancelled branch of the If.
+        """
+        self.tasks.pop(task.id, None)
+        self._new_tasks.pop(task.id, None)
+        self._fused.pop(task.id, None)
+
     def optimize(self):
         """
         Perform CPM on the DAG of non-submitted tasks.
         Assign start_times and priorities according to the slack time.
         Assume just a single resource.
+
+        The CPM is incremental, only the tasks appended since the last call are processed.
+        Changes of their estimates are propagated forward (task.start_time, the earliest start)
+        and backward (task.critical_path, the longest path to the end of the known DAG)
+        as long as the values change.
         :return:
         """
-        # perform topological sort
-        def predecessors(task):
-            if task.is_finished():
-                return []
-            else:
-                max_end_time = 0
-                for pre in task.inputs:
-                    max_end_time = max(max_end_time, pre.start_time + pre.eval_time)
-                task.start_time = max_end_time
-            return task.inputs
-
-        def post_visit(task):
+        new_tasks = self._new_tasks
+        if not new_tasks:
+            return
+        self._new_tasks = {}
+
+        # topological sort of the new tasks
+        topology_sort = []
+        dfs.DFS(neighbours=lambda task: [pre for pre in task.inputs if pre.id in new_tasks],
+                postvisit=topology_sort.append).run(new_tasks.values())
+
+        def old_tasks(tasks):
+            return [task for task in tasks if task.id not in new_tasks]
+        self._propagate(topology_sort, self._update_start_time, self._relax_start_time,
+                        lambda task: old_tasks(task.outputs))
+        self._propagate(reversed(topology_sort), self._update_critical_path, self._relax_critical_path,
+                        lambda task: old_tasks(task.inputs))
+        for task in topology_sort:
             task.resource_id = 0
             self.ready_queue_push(task)
-            self._topology_sort.append(task)
 
+        #print("N task: ", len(self.tasks))
 
-        dfs.DFS(neighbours=predecessors,
-                postvisit=post_visit).run(self.tasks.values())
+    @staticmethod
+    def _propagate(tasks, update, relax, neighbours):
+        """
+        Update all 'tasks' (in order) and then their neighbours as long as the update changes the task.
+        Neighbours are updated just by the changed task in order to keep the cost independent
+        of their number of inputs or outputs (e.g. the list collecting results of a large fan-out).
+        :param update: update(task) -> bool, True if the task value has changed.
+        :param relax: relax(source, task) -> bool, update the task by the changed neighbour 'source'.
+        :param neighbours: neighbours(task) -> List of tasks affected by the change of the task.
+        """
+        queue = collections.deque()
+        for task in tasks:
+            if update(task):
+                queue.extend((task, neighbour) for neighbour in neighbours(task))
+        while queue:
+            source, task = queue.popleft()
+            if not task.is_finished() and relax(source, task):
+                queue.extend((task, neighbour) for neighbour in neighbours(task))
 
-        #print("N task: ", len(self.tasks))
+    @staticmethod
+    def _update_start_time(task):
+        if task.is_finished():
+            return False
+        max_end_time = 0
+        for pre in task.inputs:
+            max_end_time = max(max_end_time, pre.start_time + pre.eval_time)
+        changed = max_end_time != task.start_time
+        task.start_time = max_end_time
+        return changed
+
+    @staticmethod
+    def _relax_start_time(pre, task):
+        end_time = pre.start_time + pre.eval_time
+        if end_time > task.start_time:
+            task.start_time = end_time
+            return True
+        return False
+
+    @staticmethod
+    def _update_critical_path(task):
+        if task.is_finished():
+            return False
+        max_path = 0
+        for post in task.outputs:
+            max_path = max(max_path, post.critical_path)
+        critical_path = task.eval_time + max_path
+        changed = critical_path != task.critical_path
+        task.critical_path = critical_path
+        return changed
+
+    @staticmethod
+    def _relax_critical_path(post, task):
+        critical_path = task.eval_time + post.critical_path
+        if critical_path > task.critical_path:
+            task.critical_path = critical_path
+            return True
+        return False
 
 
 
@@ -257,6 +743,11 @@ class Evaluation:
     :param inputs:
     :return: List of all tasks.
     """
+    task_size_estimate = 1024
+    # Estimated memory footprint of a single task including the scheduler records. [bytes]
+    outcomes_file = ".visip_outcomes"
+    # Name of the file of the decision outcomes in the workspace, see 'speculative'.
+
     @staticmethod
     def make_analysis(action: base._ActionBase, inputs:List[DataOrDummy]):
         """
@@ -288,13 +779,48 @@ class Evaluation:
     def __init__(self,
                  scheduler: Scheduler = None,
                  workspace: str = ".",
-                 plot_expansion: bool = False
+                 plot_expansion: bool = False,
+                 persistent_cache: Union[bool, str] = False,
+                 memory_limit: int = None,
+                 keep_results: bool = True,
+                 speculative: bool = False,
+                 fuse_tasks: bool = False,
+                 artifacts: bool = False,
+                 result_cache_bytes: int = None,
+                 cache_policy: str = 'lru'
                  ):
         """
         Create object for evaluation of the workflow 'analysis' with no parameters.
         Use 'make_analysis' to substitute arguments to arbitrary action.
 
         :param analysis: an action without inputs
+        :param persistent_cache: Use the result cache stored in the workspace, shared by all resources.
+        Tasks with unchanged inputs are not evaluated again in subsequent evaluations.
+        The backend is 'file' (FileResultCache, used for True) or 'sqlite' (SQLiteResultCache).
+        With 'result_cache_bytes' the values are read through the in-memory cache (see TieredResultCache).
+        :param memory_limit: Estimated memory of the task tree and the results [bytes] over which
+        the expansion of composed tasks is postponed. If set, the expanded body of every finished
+        composed task is released, keeping just its result. Without 'persistent_cache' the released results
+        kept by the default in-memory result caches of the resources are bounded by the same limit
+        unless 'result_cache_bytes' is given. No limit by default.
+        :param keep_results: Keep results of all tasks for inspection (e.g. in GUI).
+        If False, the result of a task is released as soon as all its consumers are finished.
+        Released results are available through 'task_result' as long as they are in the result cache.
+        :param speculative: Speculative expansion of the composed tasks waiting for a decision (e.g. If condition)
+        when the resources are idle. The guess is given by the action hint or by the last outcome
+        of the same task in a previous evaluation. The outcomes are kept in the memory by the result cache
+        of the first resource, i.e. only for the next evaluations by the same resource. With 'persistent_cache'
+        they are also stored in the workspace (see 'outcomes_file') and used by any later evaluation.
+        :param fuse_tasks: Evaluate the cheap tasks (constants, lists, items, heads, see _ActionBase.fusible)
+        in place together with the task finishing their inputs (see Scheduler.fuse), they do not pass
+        the ready queue, the CPM and the result cache. Their released results are not available through 'task_result'.
+        :param artifacts: Keep the files of the results (FileIn) in the content addressed store in the workspace
+        (see ArtifactStore). Missing files of the cached results are restored from the store, so the tasks
+        producing them need not to be evaluated again. Cached results with changed files are not used.
+        Use with 'persistent_cache'.
+        :param result_cache_bytes: Size of the in-memory result cache [bytes], values are evicted by the 'cache_policy'
+        (see BoundedResultCache). Without 'persistent_cache' it is shared by the resources with the default cache.
+        Unbounded by default.
         """
         if scheduler is None:
             scheduler = Scheduler([ Resource() ])
@@ -306,10 +832,57 @@ class Evaluation:
 
         self.composed_id = 0
         # Auxiliary ID of composed tasks to break ties
+        self.n_expanded = 0
+        # Number of expanded composed tasks.
         self.queue = []
         # Priority queue of the composed tasks to expand. Tasks are expanded until the task DAG is not
         # complete or number of unresolved tasks is smaller then given limit.
+        self.memory_limit = memory_limit
+        self.keep_results = keep_results
+        self.speculative = speculative
+        self.fuse_tasks = fuse_tasks
+        self._n_done_consumers = {}
+        # Number of leading finished consumers of the tasks with not released results: task ID -> int
+        self.memory_estimate = 0
+        # Estimated memory of the live tasks and their results, updated only if memory_limit is set. [bytes]
+        self._footprint = collections.defaultdict(int)
+        # Memory of the direct childs of the expanded composed tasks: composed task ID -> bytes
+        self._cancelled = set()
+        # IDs of the cancelled composed tasks, possibly still in the expansion queue.
+        self._own_caches = []
+        # Caches created by the evaluation, closed by 'close'.
+        self._outcomes_path = None
+        # Absolute path of the outcomes file, only with 'speculative' and 'persistent_cache'.
+        self._outcomes = {}
+        # Outcomes recorded by this evaluation, saved by 'close': outcome hash -> value
+        self._past_outcomes = {}
+        # Outcomes of the previous evaluations loaded from the outcomes file.
+        if speculative and persistent_cache:
+            self._outcomes_path = os.path.abspath(os.path.join(workspace, self.outcomes_file))
+            self._past_outcomes = self._load_outcomes()
         os.makedirs(workspace, exist_ok=True)
+        if persistent_cache:
+            assert persistent_cache in (True, 'file', 'sqlite'), "Unknown persistent cache: {}".format(persistent_cache)
+            if persistent_cache == 'sqlite':
+                cache = SQLiteResultCache(os.path.join(workspace, SQLiteResultCache.default_file))
+            else:
+                cache = FileResultCache(os.path.join(workspace, FileResultCache.default_dir))
+            if result_cache_bytes is not None:
+                cache = TieredResultCache(cache, result_cache_bytes, cache_policy)
+            self._own_caches.append(cache)
+            for resource in self.scheduler.resources:
+                resource.cache = cache
+        elif result_cache_bytes is not None or memory_limit is not None:
+            if result_cache_bytes is None:
+                result_cache_bytes = memory_limit
+            cache = BoundedResultCache(result_cache_bytes, cache_policy)
+            for resource in self.scheduler.resources:
+                if type(resource.cache) is ResultCache and not resource.cache.cache:
+                    resource.cache = cache
+        if artifacts:
+            store = ArtifactStore(os.path.join(workspace, ArtifactStore.default_dir))
+            for resource in self.scheduler.resources:
+                resource.artifacts = store
 
         self.force_finish = False
         # Used to force end of evaluation after an error.
@@ -320,10 +893,19 @@ class Evaluation:
 
 
     def tasks_update(self, tasks):
+        if self.fuse_tasks:
+            fused = [t for t in tasks if self._is_fusible(t)]
+            if fused:
+                tasks = [t for t in tasks if not self._is_fusible(t)]
+                self.scheduler.fuse(fused)
         for t in tasks:
             self.estimate_task_eval_time(t)
         self.scheduler.append(tasks)
 
+    @staticmethod
+    def _is_fusible(task):
+        return type(task) in (task_mod.Atomic, task_mod.ComposedHead) and task.action.fusible
+
     def estimate_task_eval_time(self, task):
         """
         Estimate the task evaluation time using the action and result_db.
@@ -333,7 +915,7 @@ class Evaluation:
         if task.is_finished():
             task.eval_time = task.end_time - task.start_time
         else:
-            task.time_estimate = 1
+            task.eval_time = 1
 
     def validate_connections(self, action):
         """
@@ -356,6 +938,69 @@ class Evaluation:
 
         :return:
         """
+        self._start(analysis)
+        try:
+            with tools.change_cwd(self.workspace):
+                # print("CWD: ", os.getcwd())
+                self._validate()
+                while not self.force_finish:
+                    if self._execute_step():
+                        self.scheduler.wait()
+        finally:
+            self.close()
+        return self.final_task
+
+    async def execute_async(self, analysis) -> task_mod._TaskBase:
+        """
+        Execute the workflow as a coroutine, the event loop is not blocked while waiting
+        for running tasks. Use resources that do not block the loop (AsyncioResource, pool resources).
+        Note that the workspace is set as CWD of the whole process during the execution.
+        """
+        self._start(analysis)
+        try:
+            with tools.change_cwd(self.workspace):
+                self._validate()
+                while not self.force_finish:
+                    if self._execute_step():
+                        await self.scheduler.wait_async()
+                    else:
+                        # Let the loop run the submitted coroutines.
+                        await asyncio.sleep(0)
+        finally:
+            self.close()
+        return self.final_task
+
+    def close(self):
+        """
+        Close the result caches created by the evaluation, called at the end of 'execute'.
+        The closed caches are still available to 'task_result'.
+        """
+        for cache in self._own_caches:
+            cache.close()
+        if self._outcomes_path is not None and self._outcomes:
+            outcomes = self._load_outcomes()
+            outcomes.update(self._outcomes)
+            # Complete file appears at once.
+            tmp_path = "{}.{}.tmp".format(self._outcomes_path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                pickle.dump(outcomes, f)
+            os.replace(tmp_path, self._outcomes_path)
+            self._outcomes = {}
+
+    def _load_outcomes(self):
+        try:
+            with open(self._outcomes_path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start(self, analysis):
         #TODO: Reinit scheduler and own structures to allow reuse of the Evaluation object.
 
         self.final_task = task_mod._TaskBase._create_task(analysis, [], None, '__root__')
@@ -363,22 +1008,31 @@ class Evaluation:
         # init scheduler
         self.tasks_update([self.final_task])
 
-        with tools.change_cwd(self.workspace):
-            # print("CWD: ", os.getcwd())
-            invalid_connections = self.validate_connections(self.final_task.action)
-            if invalid_connections:
-                raise Exception(invalid_connections)
-            while not self.force_finish:
-                schedule = self.expand_tasks()
-                if self.plot_expansion and len(schedule) > 0:
-                    self._plot_task_graph()
-                self.tasks_update(schedule)
-                self.scheduler.update()
-                self.scheduler.optimize()
-                if  self.scheduler.n_assigned_tasks == 0:
-                    self.force_finish = True
-        return self.final_task
+    def _validate(self):
+        invalid_connections = self.validate_connections(self.final_task.action)
+        if invalid_connections:
+            raise Exception(invalid_connections)
 
+    def _execute_step(self) -> bool:
+        """
+        Single pass of the main loop: expand composed tasks, update the scheduler.
+        :return: True if no progress is possible until a running task is finished.
+        """
+        n_expanded = self.n_expanded
+        schedule = self.expand_tasks()
+        if self.plot_expansion and len(schedule) > 0:
+            self._plot_task_graph()
+        self.tasks_update(schedule)
+        finished = self.scheduler.update()
+        if not self.keep_results:
+            self._release_results(finished)
+        if self.memory_limit is not None:
+            self._release_finished(finished)
+        self.scheduler.optimize()
+        if  self.scheduler.n_assigned_tasks == 0 and self.scheduler.n_running_tasks == 0:
+            self.force_finish = True
+            return False
+        return not finished and n_expanded == self.n_expanded and self.scheduler.n_running_tasks > 0
 
 
 
@@ -398,25 +1052,195 @@ class Evaluation:
         postpone_expand = []
         # List of composed tasks with postponed expansion, have to be re-enqueued.
 
-        while self.queue and not self.force_finish and self.scheduler.can_expand():
+        n_expanded = self.n_expanded
+        while self.queue and not self.force_finish and self.can_expand(self.n_expanded - n_expanded, len(schedule)):
             composed_id, time, composed_task = heapq.heappop(self.queue)
-            task_dict = composed_task.expand()
-
-            if task_dict is None:
+            if composed_task.id in self._cancelled:
+                self._cancelled.discard(composed_task.id)
+                continue
+            heads = composed_task.inputs
+            if hasattr(composed_task.action, 'outcome'):
+                self._record_outcome(composed_task)
+            tasks = None if composed_task.is_deferred() else composed_task.expand()
+            if tasks is None and self.speculative and self.scheduler.is_idle():
+                tasks = self._speculate(composed_task)
+
+            if tasks is None:
                 # Can not expand yet, return back into queue
                 postpone_expand.append(composed_task)
             else:
-                # print("Expanded: ", task_dict)
-                for task in task_dict.values():
+                self.n_expanded += 1
+                if self.memory_limit is not None:
+                    self._add_footprint(composed_task, tasks)
+                for head in heads:
+                    if not head.outputs:
+                        # Not used by the expansion.
+                        self.cancel(head.inputs[0])
+                for task in tasks:
                     if isinstance(task, task_mod.Composed):
                         self.enqueue(task)
                     else:
                         schedule.append(task)
-                self.tasks_update([composed_task])
+                consumer = composed_task.eliminate_tail_call()
+                if consumer is None:
+                    self.tasks_update([composed_task])
+                else:
+                    # Bypassed task is not scheduled, its consumer has a new input.
+                    if self.memory_limit is not None:
+                        self._footprint[consumer.id] += self._footprint.pop(composed_task.id, 0)
+                    self.tasks_update([consumer])
         for task in postpone_expand:
             self.enqueue(task)
         return schedule
 
+    @staticmethod
+    def _outcome_hash(task):
+        return data.hash(task.id, previous=data.hash("outcome"))
+
+    def _record_outcome(self, task):
+        outcome = task.action.outcome(task)
+        if outcome is not None:
+            decision_task, value = outcome
+            outcome_hash = self._outcome_hash(decision_task)
+            self.scheduler.resources[0].cache.insert_volatile(outcome_hash, value)
+            if self._outcomes_path is not None:
+                self._outcomes[outcome_hash] = value
+
+    def _speculate(self, task):
+        """
+        Speculative expansion of the postponed composed task.
+        :return: List of the child tasks or None if there is no guess.
+        """
+        if not hasattr(task.action, 'speculate') or task.is_deferred():
+            return None
+        guess = getattr(task.action, 'likely', None)
+        if guess is None:
+            cache = self.scheduler.resources[0].cache
+            outcome_hash = self._outcome_hash(task)
+            guess = cache.value(outcome_hash)
+            if guess is cache.NoValue:
+                guess = self._past_outcomes.get(outcome_hash, None)
+            if guess is None:
+                return None
+        return task.expand(guess=guess)
+
+    def cancel(self, task):
+        """
+        Cancel the task if it is not needed, i.e. it has no consumers and is neither finished nor submitted.
+        Its inputs are cancelled recursively.
+        """
+        stack = [task]
+        while stack:
+            task = stack.pop()
+            if task.outputs or task is self.final_task or task.status >= task_mod.Status.submitted \
+                    or task.is_finished():
+                continue
+            if isinstance(task, task_mod.Composed) and not task.is_expanded():
+                self._cancelled.add(task.id)
+            self.scheduler.remove(task)
+            stack.extend(task.detach_inputs())
+
+    def can_expand(self, n_expanded: int = 0, n_scheduled: int = 0):
+        """
+        Check limits of the expansion: number of tasks in the scheduler and the memory estimate.
+        :param n_expanded: Number of tasks expanded in current 'expand_tasks' call.
+        :param n_scheduled: Number of new tasks of the current 'expand_tasks' call, not in the scheduler yet.
+        """
+        if not self.scheduler.can_expand(n_scheduled):
+            return False
+        if self.memory_limit is None or self.memory_estimate < self.memory_limit:
+            return True
+        # Over the memory limit, expand a single task if nothing is running to avoid a deadlock.
+        return n_expanded == 0 and self.scheduler.n_running_tasks == 0
+
+    def _add_footprint(self, composed_task, childs):
+        # Heads of the composed task are already counted at expansion of its parent.
+        n_tasks = 0
+        for child in childs:
+            if child.parent is composed_task and not isinstance(child, task_mod.ComposedHead):
+                n_tasks += 1
+                if isinstance(child, task_mod.Composed):
+                    n_tasks += len(child.inputs)
+        size = n_tasks * self.task_size_estimate
+        self._footprint[composed_task.id] += size
+        self.memory_estimate += size
+
+    def _release_finished(self, finished):
+        """
+        Account results of the finished tasks, release bodies of the finished composed tasks.
+        Results of composed tasks and heads are shared with their inner tasks and counted only after release.
+        """
+        for task in finished:
+            if isinstance(task, task_mod.ComposedHead):
+                continue
+            if isinstance(task, task_mod.Composed):
+                if task.is_expanded():
+                    task.collapse()
+                    self.memory_estimate -= self._footprint.pop(task.id, 0)
+            if task.parent is not None:
+                size = data.size_estimate(task.result)
+                self._footprint[task.parent.id] += size
+                self.memory_estimate += size
+
+    def _consumers_finished(self, task):
+        """
+        Check that all consumers of the task result are finished.
+        Heads pass the result of their input to the tasks of the composed task body, so their consumers are checked too.
+        """
+        outputs = task.outputs
+        # Consumers are finished in arbitrary order, the leading finished ones are skipped by the next check.
+        i = self._n_done_consumers.get(task.id, 0)
+        while i < len(outputs):
+            consumer = outputs[i]
+            if not consumer.is_finished():
+                break
+            if isinstance(consumer, task_mod.ComposedHead):
+                # The head itself is evaluated from the input result as well.
+                if consumer.status != task_mod.Status.finished or not self._consumers_finished(consumer):
+                    break
+            i += 1
+        if i < len(outputs):
+            self._n_done_consumers[task.id] = i
+            return False
+        self._n_done_consumers.pop(task.id, None)
+        return True
+
+    def _release_results(self, finished):
+        """
+        Release results of the inputs of the finished tasks that have all their consumers finished.
+        Tasks without consumers, in particular the final task, keep their results.
+        """
+        for task in finished:
+            inputs = list(task.inputs)
+            while inputs:
+                input = inputs.pop()
+                if isinstance(input, task_mod.ComposedHead):
+                    # No own result, check the task passed through the head.
+                    inputs.extend(input.inputs)
+                elif not input.is_released() and self._consumers_finished(input):
+                    self._release(input)
+
+    def _release(self, task):
+        if self.memory_limit is not None and task.parent is not None and task.parent.id in self._footprint:
+            size = data.size_estimate(task.result)
+            self._footprint[task.parent.id] -= size
+            self.memory_estimate -= size
+        task.release()
+
+    def task_result(self, task):
+        """
+        Result of the task, possibly released result retrieved from the result cache.
+        Returns the task_mod._TaskBase.Released placeholder if not found.
+        """
+        result = task.result
+        if result is not task_mod._TaskBase.Released:
+            return result
+        for resource in self.scheduler.resources:
+            value = resource.cache.value(task.result_hash)
+            if value is not ResultCache.NoValue:
+                return value
+        return result
+
     # def extract_input(self):
     #     input_data = List(*[i._result for i in self._inputs])
 
@@ -480,3 +1304,26 @@ def run(action: Union[base._ActionBase, wrap.ActionWrapper],
     analysis = Evaluation.make_analysis(action, inputs)
     eval_obj = Evaluation(**kwargs)
     return eval_obj.execute(analysis).result
+
+
+
+async def run_async(action: Union[base._ActionBase, wrap.ActionWrapper],
+        inputs:List[DataOrDummy] = None,
+        **kwargs) -> dtype.DataType:
+    """
+    Run the 'action' with given arguments 'inputs' on the running event loop.
+    Return the data result. Coroutine actions are evaluated concurrently by the AsyncioResource
+    unless a scheduler is given.
+    """
+    if isinstance(action, wrap.ActionWrapper):
+        action = action.action
+    if inputs is None:
+        inputs = []
+    analysis = Evaluation.make_analysis(action, inputs)
+    if kwargs.get('scheduler', None) is None:
+        with AsyncioResource() as resource:
+            kwargs['scheduler'] = Scheduler([resource])
+            final_task = await Evaluation(**kwargs).execute_async(analysis)
+    else:
+        final_task = await Evaluation(**kwargs).execute_async(analysis)
+    return final_task.result
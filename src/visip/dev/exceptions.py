@@ -16,4 +16,7 @@ class ExcVCommandFailed(Exception):
 
 
 class ExcInvalidCall(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class ExcNotStaticWorkflow(Exception):
+    pass
@@ -14,8 +14,12 @@ While(body_
 
 
 """
+from typing import *
+import numpy as np
 from . import base
+from . import data
 from . import exceptions
+from . import task as task_mod
 from ..action import constructor
 from ..dev.parameters import Parameters, ActionParameter
 from . import dtype
@@ -57,6 +61,7 @@ class MetaAction(base._ActionBase):
 
             List of named child tasks.
             Must contain a '__result__' child task, that will be used to connect tasks dependent on the expanded task.
+            Inputs not used by the child tasks are unlinked, their producers are cancelled unless used elsewhere.
         """
         assert False, "Missing definition."
 
@@ -66,7 +71,24 @@ class MetaAction(base._ActionBase):
         :param input_task:
         :return:
         """
-        action = input_task.result
+        return self._to_action(input_task.result)
+
+    def static_action(self, input_task):
+        """
+        Extract the action given by a constant (e.g. in the workflow), possibly before the input task is evaluated.
+        :return: The action or None if not known yet.
+        """
+        if input_task.is_finished():
+            return self.dynamic_action(input_task)
+        while isinstance(input_task.action, constructor.Pass):
+            # Heads
+            input_task = input_task.inputs[0]
+        if isinstance(input_task.action, constructor.Value):
+            return self._to_action(input_task.action.value)
+        return None
+
+    @staticmethod
+    def _to_action(action):
         if isinstance(action, wrap.ActionWrapper):
             action = action.action
         if not isinstance(action, base._ActionBase):
@@ -74,98 +96,99 @@ class MetaAction(base._ActionBase):
         return action
 
 
-"""
-Partial TODO:
+class _BoundValue(base._ActionBase):
+    """
+    Auxiliary action of the _PartialClosure and the BatchMap. Return the bound value, the result hash
+    is given by the hash of the original input task, so the bound value is never rehashed.
+    """
+    def __init__(self, value, value_hash):
+        super().__init__("bound")
+        self._value = value
+        self._value_hash = value_hash
+        self._parameters = Parameters()
+        self._output_type = dtype.Any
 
-2. Not clear how current expansion make actual task dependent on its childs.
-4. Implement Partial expanding to preliminary evaluation returning the closure complex action containing the captured input tasks X.
-5. Implement the closure complex action:
-   - have dynamically determined parameters Y
-   - expand to the task of closure action conected to both X and Y tasks  
-"""
+    def action_hash(self):
+        return self._value_hash
+
+    def evaluate(self, inputs):
+        return self._value
 
 
-# class _PartialClosure(MetaAction):
-#
-#     def __init__(self, function: base._ActionBase, args, kwargs):
-#         super().__init__("PartialClosure")
-#         self._function = function
-#         self._arg_tasks = args
-#         self._kwarg_tasks = kwargs
-#         # TODO: filter paratemters set Paratemers
-#         self._parameters = Parameters()
-#         # ?? Probably no need to specify parameters as the closure input substitution works only with tasks.
-#         # But we can make a check in the expansion step.
-#
-#
-#         # This allows DynamicCall to work
-#
-#     def expand(self, task, task_creator):
-#         # Always expand create the task with merged inputs.
-#         #TODO: merge new inputs to partial_args
-#         pass
-#
-#
-#
-# class Partial(MetaAction):
-#     def __init__(self):
-#         """
-#         Partial argument binding, creates a closure.
-#         TODO: support kwargs in visip, necessary for perfect forwarding
-#         """
-#         super().__init__("Partial")
-#         self._parameters = Parameters()
-#         PartialReturnType = dtype.TypeVar('PartialReturnType')
-#
-#         self._parameters.append(
-#             ActionParameter(name="function", type=dtype.Callable[..., PartialReturnType]))
-#         self._parameters.append(
-#             ActionParameter(name=None, type=dtype.Any, default=ActionParameter.no_default))
-#         # TODO: Support for kwargs forwarding.
-#         # TODO: Match 'function' parameters and given arguments.
-#         #self._parameters.append(
-#         #    ActionParameter(name=None, type=typing.Any, default=ActionParameter.no_default))
-#         self._output_type = dtype.Callable[..., PartialReturnType]
-#
-#
-#     def expand(self, task, task_creator):
-#         # TODO: need either support for partial substitution in Action Wrapper or must do it here.
-#         # Parameters of the resulting action must be determined dynamicaly.
-#         # TODO: Here is significant problem with parameter types since all are
-#         # optional
-#         assert len(task.inputs) == self._parameters.size()
-#         if task.inputs[0].is_finished():
-#             # Create the closure and mark the Partial task finished
-#             # independently on the status of the enclosed intputs.
-#             closure = _PartialClosure(self.dynamic_action(task.inputs[0]), task.inputs[1], {})
-#             task.finish(closure, task.lazy_hash()) # ?? May not work.
-#
-#             return [task_creator('__result__', constructor.Pass(), [task])]
-#         else:
-#             return None
-
-#
-# PartialReturnType = dtype.TypeVar('PartialReturnType')
-# @decorators.action_def
-# def partial(function:dtype.Callable[..., PartialReturnType], *args:dtype.List[dtype.Any]) -> dtype.Callable[..., PartialReturnType]:
-#     # TODO: kwargs support
-#     assert isinstance(function, base._ActionBase)
-#     partial_fn_evaluate = functools.partial(function.evaluate, *args)
-#     partial_fn_evaluate.__name__ = "partial_" + function.name
-#     #partial_fn_evaluate.__annotations__
-#     return decorators.action_def(_PartialResult(function, *args))
-#
-#
-# class _PartialResult(base._ActionBase):
-#     def __init__(self, function, *args):
-#         super().__init__(action_name="partial_" + function.name)
-#         self._function = function
-#         self._args = args
-#         all_parameters = function._parameters
-#         self._parameters = parameters.Parameters()
-#         self._parameters
-#
-#     def evaluate(self, inputs):
+class _PartialClosure(base._ActionBase):
+    """
+    The 'function' with the leading arguments bound to the results of already finished tasks.
+    Result hashes of the bound arguments are captured with the values, the action hash is computed once,
+    so the calls of the closure (e.g. in ForEach) share the bound values without their rehashing.
+    """
+    def __init__(self, function: base._ActionBase, values: List[Any], value_hashes: List[int]):
+        super().__init__("partial_" + function.name)
+        self._function = function
+        self._values = values
+        self._value_hashes = value_hashes
+        self.task_type = function.task_type
+        self.vectorized = function.vectorized
+        self._parameters = Parameters()
+        n_bound = len(values)
+        for param in function.parameters:
+            if param.name is None or param.idx >= n_bound:
+                self._parameters.append(ActionParameter(param.name, param.type, param.default))
+        self._output_type = function.output_type
+        closure_hash = data.hash(self.name, previous=function.action_hash())
+        for value_hash in value_hashes:
+            closure_hash = data.hash(value_hash, previous=closure_hash)
+        self._hash = closure_hash
+
+    def action_hash(self):
+        return self._hash
+
+    def evaluate(self, inputs):
+        if self.vectorized:
+            # Bound values are not stacked, broadcast them.
+            n_calls = len(inputs[0])
+            bound = [np.stack([value] * n_calls) for value in self._values]
+            return self._function.evaluate([*bound, *inputs])
+        return self._function.evaluate([*self._values, *inputs])
+
+    def expand(self, task, task_creator):
+        """
+        Expansion of the closure of a composed function. The bound values enter through
+        the constant '_BoundValue' tasks.
+        """
+        bound = [task_creator(('bound', i), _BoundValue(value, value_hash), [])
+                 for i, (value, value_hash) in enumerate(zip(self._values, self._value_hashes))]
+        inputs = [head.inputs[0] for head in task.inputs]
+        return [*bound, task_creator('__result__', self._function, [*bound, *inputs])]
+
+
+class Partial(MetaAction):
+    def __init__(self):
+        """
+        Partial argument binding, creates a closure, see _PartialClosure.
+        The closure is created once all the bound arguments are evaluated.
+        TODO: support kwargs in visip, necessary for perfect forwarding
+        """
+        super().__init__("partial")
+        self._parameters = Parameters()
+        PartialReturnType = dtype.TypeVar('PartialReturnType')
+        self._parameters.append(
+            ActionParameter(name="function", type=dtype.Callable[..., PartialReturnType]))
+        self._parameters.append(
+            ActionParameter(name=None, type=dtype.Any, default=ActionParameter.no_default))
+        self._output_type = dtype.Callable[..., PartialReturnType]
+
+    def expand(self, task, task_creator):
+        if not all([i_task.is_finished() for i_task in task.inputs]):
+            return None
+        function = self.dynamic_action(task.inputs[0])
+        args = task.inputs[1:]
+        n_params = function.parameters.size()
+        if len(args) > n_params and not function.parameters.is_variadic():
+            raise exceptions.ExcInvalidCall(
+                "Too many arguments bound to: {}, {} > {}".format(function.name, len(args), n_params))
+        closure = _PartialClosure(function, [arg.result for arg in args], [arg.result_hash for arg in args])
+        return [task_creator('__result__', constructor.Value(closure), [])]
+
 
 class DynamicCall(MetaAction):
     def __init__(self):
@@ -196,15 +219,25 @@ class DynamicCall(MetaAction):
 
 class _If(MetaAction):
     """
-    How to inform scheduler, that evaluaation of the condition hve higher priority
-    then the true and false inputs?
+    Call the 'true_body' or the 'false_body' action according to the 'condition'.
+
+    The task is expanded as soon as the condition and the action of the taken branch are known.
+    Evaluation of the branch inputs is deferred until the condition is known (see 'lazy_input'),
+    so the scheduler evaluates the condition first. After the expansion the tasks producing
+    the untaken branch are cancelled (see Evaluation.cancel).
+
+    Speculative evaluation (see Evaluation 'speculative'): while the condition is not known,
+    the task may be expanded to the call of the likely branch and the _IfResolve task
+    that either passes its result or calls the other branch once the condition is known.
     """
-    def __init__(self):
+    def __init__(self, likely: bool = None):
         """
         Constructed by the Dummy.__call__.
         TODO: support kwargs in visip, necessary for perferct forwarding
+        :param likely: Hint for the speculative evaluation, the likely value of the condition.
         """
         super().__init__("DynamicCall")
+        self.likely = likely
         self._parameters = Parameters()
         ReturnType = dtype.TypeVar('ReturnType')
         self._parameters.append(
@@ -215,18 +248,416 @@ class _If(MetaAction):
             ActionParameter(name="false_body", type=dtype.Callable[..., ReturnType]))
         self._output_type = ReturnType
 
+    @staticmethod
+    def _taken_branch(task):
+        return task.inputs[1] if task.inputs[0].result else task.inputs[2]
+
+    def outcome(self, task):
+        """
+        Return the task making the decision and the condition value, None if not known yet.
+        """
+        condition = task.inputs[0]
+        if not condition.is_finished():
+            return None
+        return task, bool(condition.result)
+
+    def lazy_input(self, task, head):
+        if head is task.inputs[0]:
+            return False
+        return not task.inputs[0].is_finished() or head is not self._taken_branch(task)
+
     def expand(self, task, task_creator):
-        if all([ i_task.is_finished() for i_task in task.inputs]):
-            condition = task.inputs[0].result
-            if condition:
-                return [task_creator('__result__', self.dynamic_action(task.inputs[1]), [])]
-            else:
-                return [task_creator('__result__', self.dynamic_action(task.inputs[2]), [])]
+        if not task.inputs[0].is_finished():
+            return None
+        body = self.static_action(self._taken_branch(task))
+        if body is None:
+            return None
+        return [task_creator('__result__', body, [])]
+
+    def speculate(self, task, task_creator, guess: bool):
+        """
+        Expansion before the condition is known, assuming its value 'guess'.
+        :return: None if the action of the guessed branch is not known yet.
+        """
+        body = self.static_action(task.inputs[1] if guess else task.inputs[2])
+        if body is None:
+            return None
+        speculative = task_creator(('speculative', guess), body, [])
+        resolve = task_creator('__result__', _IfResolve(guess),
+                               [head.inputs[0] for head in task.inputs] + [speculative])
+        return [speculative, resolve]
+
+
+class _IfResolve(_If):
+    """
+    Auxiliary action of the speculative If, inputs are the If inputs and the result of the 'guess' branch.
+    """
+    def __init__(self, guess: bool):
+        super().__init__()
+        self.name = "IfResolve"
+        self._guess = guess
+        self._parameters.append(
+            ActionParameter(name="speculative", type=self._output_type))
+
+    def _guessed(self, task):
+        condition = task.inputs[0]
+        return condition.is_finished() and bool(condition.result) == self._guess
+
+    def outcome(self, task):
+        outcome = super().outcome(task)
+        if outcome is None:
+            return None
+        # The decision of the original If task.
+        return task.parent, outcome[1]
+
+    def lazy_input(self, task, head):
+        if head is task.inputs[3]:
+            return False
+        if self._guessed(task):
+            return head is not task.inputs[0]
+        return super().lazy_input(task, head)
+
+    def expand(self, task, task_creator):
+        if self._guessed(task):
+            # The speculative task may be still running, connect to it directly, heads are not scheduled.
+            return [task_creator('__result__', constructor.Pass(), [task.inputs[3].inputs[0]])]
+        # Wrong guess, the speculative task is cancelled or its result is discarded.
+        return super().expand(task, task_creator)
+
+    def speculate(self, task, task_creator, guess: bool):
+        return None
+
+
+class _ChunkMap(base._ActionBase):
+    """
+    Auxiliary action of the BatchMap. Apply the 'function' to the items of the input chunk lists.
+    A vectorized function is called once on the items stacked into numpy arrays, the result is split
+    along the first axis. Items of a 1D result are converted to Python scalars as returned by the per-item calls,
+    rows of a multidimensional result are numpy arrays. A tuple result (several outputs) is split per element
+    and zipped back into the tuples. Other functions are called for every item.
+    """
+    def __init__(self, function: base._ActionBase):
+        super().__init__("ChunkMap")
+        self._function = function
+        self._parameters = Parameters()
+        self._parameters.append(ActionParameter(name=None, type=dtype.List[dtype.Any]))
+        self._output_type = dtype.List[dtype.Any]
+
+    def action_hash(self):
+        return data.hash(self.name, previous=self._function.action_hash())
+
+    def evaluate(self, inputs):
+        if self._function.vectorized:
+            result = self._function.evaluate([np.stack(chunk) for chunk in inputs])
+            return self._split(result, len(inputs[0]))
         else:
+            return [self._function.evaluate(args) for args in zip(*inputs)]
+
+    def _split(self, result, n_items: int) -> List[Any]:
+        if isinstance(result, tuple):
+            return list(zip(*[self._split(output, n_items) for output in result]))
+        result = np.asarray(result)
+        if result.ndim == 0 or len(result) != n_items:
+            raise exceptions.ExcInvalidCall("Vectorized {} returned {} results for {} items.".format(
+                self._function.name, len(result) if result.ndim else "scalar", n_items))
+        if result.ndim == 1:
+            return result.tolist()
+        return list(result)
+
+
+class _Concat(constructor._ListBase):
+    """
+    Auxiliary action of the BatchMap. Concatenate the input lists.
+    """
+    def __init__(self):
+        super().__init__(action_name='concat')
+
+    def evaluate(self, inputs):
+        return [item for items in inputs for item in items]
+
+
+class _BatchMap(MetaAction):
+    """
+    Apply the 'function' to the items of the input lists, i.e. map(function, *lists).
+    Items are processed in chunks of 'chunk_size', a single task per chunk. The input lists are split
+    during the expansion, every chunk task gets just its items through the '_BoundValue' tasks.
+    The function marked as vectorized is evaluated once for the whole chunk on the stacked items,
+    see 'action_def'. The function must be atomic, composed functions (workflows) are mapped by ForEach.
+    """
+    def __init__(self):
+        super().__init__("batch_map")
+        self._parameters = Parameters()
+        ReturnType = dtype.TypeVar('ReturnType')
+        self._parameters.append(
+            ActionParameter(name="function", type=dtype.Callable[..., ReturnType]))
+        self._parameters.append(
+            ActionParameter(name="chunk_size", type=int))
+        self._parameters.append(
+            ActionParameter(name=None, type=dtype.List[dtype.Any], default=ActionParameter.no_default))
+        self._output_type = dtype.List[ReturnType]
+
+    def expand(self, task, task_creator):
+        if not all([i_task.is_finished() for i_task in task.inputs]):
             return None
+        function = self.dynamic_action(task.inputs[0])
+        if function.task_type != base.TaskType.Atomic:
+            raise exceptions.ExcInvalidCall("Composed function of batch_map: {}, use foreach.".format(function.name))
+        chunk_size = task.inputs[1].result
+        if chunk_size <= 0:
+            raise exceptions.ExcInvalidCall("Invalid chunk size: {}".format(chunk_size))
+        list_tasks = task.inputs[2:]
+        sizes = {len(list_task.result) for list_task in list_tasks}
+        if len(sizes) != 1:
+            raise exceptions.ExcInvalidCall("Input lists of different sizes: {}".format(sizes))
+        size = sizes.pop()
+        childs = []
+        chunk_tasks = []
+        for begin in range(0, size, chunk_size):
+            end = min(begin + chunk_size, size)
+            # Hash of the slice is given by the hash of the list, the chunks are not rehashed.
+            slices = []
+            for i, list_task in enumerate(list_tasks):
+                slice_hash = data.hash((begin, end), previous=list_task.result_hash)
+                bound = _BoundValue(list_task.result[begin:end], slice_hash)
+                slices.append(task_creator(('slice', begin, i), bound, []))
+            chunk_tasks.append(task_creator(('chunk', begin), _ChunkMap(function), slices))
+            childs.extend(slices)
+        return [*childs, *chunk_tasks, task_creator('__result__', _Concat(), chunk_tasks)]
 
 
-class While(MetaAction):
+class _Item(base._ActionBase):
+    """
+    Auxiliary action of the ForEach. Select the item 'i' of the input list.
+    The result hash is given by the item value, so that the item consumers
+    are not affected by changes of the other items.
+    """
+    def __init__(self, i: int):
+        super().__init__("item")
+        self._i = i
+        self.rehash_result = True
+        self._parameters = Parameters()
+        self._parameters.append(ActionParameter(name="items", type=dtype.List[dtype.Any]))
+        self._output_type = dtype.Any
+
+    def action_hash(self):
+        return data.hash(self._i, previous=data.hash(self.name))
+
+    def evaluate(self, inputs):
+        return inputs[0][self._i]
+
+
+class _ForEach(MetaAction):
+    """
+    Apply the 'body' action to every item of the list 'items', i.e. [body(item) for item in items].
+
+    The expansion is lazy, a list longer then 'chunk_size' is split into chunk tasks of the same action
+    for the items [begin, end), which are expanded later as the Evaluation limits permit.
+    The chunk results are concatenated once by the result task. The body tasks are named by the loop index.
+    """
+    def __init__(self, chunk_size: int = 256, begin: int = 0, end: int = None):
+        """
+        :param chunk_size: Number of items expanded at once.
+        :param begin, end: Range of the items of a chunk task, the whole list by default.
+        """
+        super().__init__("foreach")
+        self._chunk_size = chunk_size
+        self._begin = begin
+        self._end = end
+        self._parameters = Parameters()
+        ReturnType = dtype.TypeVar('ReturnType')
+        self._parameters.append(
+            ActionParameter(name="body", type=dtype.Callable[..., ReturnType]))
+        self._parameters.append(
+            ActionParameter(name="items", type=dtype.List[dtype.Any]))
+        self._output_type = dtype.List[ReturnType]
+
+    def action_hash(self):
+        return data.hash((self._chunk_size, self._begin, self._end), previous=data.hash(self.name))
+
+    def expand(self, task, task_creator):
+        if not all([i_task.is_finished() for i_task in task.inputs]):
+            return None
+        body_head, items_head = task.inputs
+        end = self._end
+        if end is None:
+            end = len(items_head.result)
+            if end > self._chunk_size:
+                # Connect the chunks directly to the inputs of the heads to avoid chains of heads.
+                inputs = [body_head.inputs[0], items_head.inputs[0]]
+                chunks = [task_creator(('chunk', begin),
+                                       _ForEach(self._chunk_size, begin, min(begin + self._chunk_size, end)),
+                                       inputs)
+                          for begin in range(0, end, self._chunk_size)]
+                return [*chunks, task_creator('__result__', _Concat(), chunks)]
+        body = self.dynamic_action(body_head)
+        childs = []
+        body_tasks = []
+        for i in range(self._begin, end):
+            item = task_creator(('item', i), _Item(i), [items_head])
+            body_tasks.append(task_creator(i, body, [item]))
+            childs.append(item)
+        childs.extend(body_tasks)
+        childs.append(task_creator('__result__', constructor.A_list(), body_tasks))
+        return childs
+
+
+class _Reduce(MetaAction):
+    """
+    Reduce the list 'items' by the binary 'function', i.e. function(...function(items[0], items[1])..., items[-1]).
+
+    An associative function (see action_def) is combined in the balanced binary tree, the combine tasks
+    of independent pairs run in parallel. Other functions are folded from the left.
+    If the items are given by the list constructed in the workflow and not used elsewhere,
+    the tree is connected directly to the item tasks, which are combined as they finish
+    without waiting for the whole list. The constructor task is left without inputs and consumers,
+    so it is cancelled and does not keep the item results.
+    """
     def __init__(self):
-        pass
+        super().__init__("reduce")
+        self._parameters = Parameters()
+        ItemType = dtype.TypeVar('ItemType')
+        self._parameters.append(
+            ActionParameter(name="function", type=dtype.Callable[..., ItemType]))
+        self._parameters.append(
+            ActionParameter(name="items", type=dtype.List[ItemType]))
+        self._output_type = ItemType
+
+    @staticmethod
+    def _item_tasks(items_head, task_creator):
+        """
+        Return new child tasks and the tasks of the items, None if not known yet.
+        """
+        items = items_head.inputs[0]
+        if not items.is_finished():
+            if isinstance(items.action, constructor.A_list) and items.outputs == [items_head] \
+                    and items.status < task_mod.Status.submitted:
+                return [], list(items.detach_inputs())
+            return None
+        item_tasks = [task_creator(('item', i), _Item(i), [items_head]) for i in range(len(items_head.result))]
+        return item_tasks, list(item_tasks)
 
+    def expand(self, task, task_creator):
+        function_head, items_head = task.inputs
+        # Need not to wait for evaluation of the function given in the workflow.
+        function = self.static_action(function_head)
+        if function is None:
+            return None
+        items = self._item_tasks(items_head, task_creator)
+        if items is None:
+            return None
+        childs, level = items
+        if not level:
+            raise exceptions.ExcInvalidCall("Reduce of an empty list.")
+        if function.associative:
+            i_level = 0
+            while len(level) > 1:
+                next_level = [task_creator(('combine', i_level, i), function, level[i:i + 2])
+                              for i in range(0, len(level) - 1, 2)]
+                if len(level) % 2:
+                    next_level.append(level[-1])
+                childs.extend(next_level[:len(level) // 2])
+                level = next_level
+                i_level += 1
+            result = level[0]
+        else:
+            result = level[0]
+            for i, item in enumerate(level[1:]):
+                result = task_creator(('fold', i), function, [result, item])
+                childs.append(result)
+        childs.append(task_creator('__result__', constructor.Pass(), [result]))
+        return childs
+
+
+def _state_args(state_task, task_creator):
+    """
+    A tuple state is unpacked into the arguments.
+    :return: New item tasks, the argument tasks.
+    """
+    state = state_task.result
+    if isinstance(state, tuple):
+        items = [task_creator(('state', i), _Item(i), [state_task]) for i in range(len(state))]
+        return items, items
+    return [], [state_task]
+
+
+class While(MetaAction):
+    """
+    Iterate 'state = body(state)' while 'predicate(state)' is true, return the final state.
+    A tuple state is unpacked into the arguments of the predicate and the body.
+
+    The loop is unrolled incrementally, every iteration is a While task expanded
+    to the predicate task and the _WhileBranch task. The branch is expanded after the predicate is evaluated
+    either to the final result or to the body task and the While task of the next iteration.
+    The nested While and _WhileBranch tasks are bypassed (see Composed.eliminate_tail_call),
+    so the scheduled part of the DAG does not grow with the number of iterations.
+    With 'collapse', the tasks of the finished iterations are released together with the bypassed
+    auxiliary tasks, so the memory does not grow with the number of iterations either.
+    Otherwise the task tree keeps all iterations.
+    Predicate and body tasks of an unchanged state hit the result cache, so a rerun resumes
+    after the last completed iteration.
+    """
+    def __init__(self, iteration: int = 0, collapse: bool = True):
+        super().__init__("While")
+        self.tail_call = True
+        self._iteration = iteration
+        self._collapse = collapse
+        self._parameters = Parameters()
+        StateType = dtype.TypeVar('StateType')
+        self._parameters.append(
+            ActionParameter(name="initial", type=StateType))
+        self._parameters.append(
+            ActionParameter(name="predicate", type=dtype.Callable[..., bool]))
+        self._parameters.append(
+            ActionParameter(name="body", type=dtype.Callable[..., StateType]))
+        self._output_type = StateType
+
+    def expand(self, task, task_creator):
+        if not all([i_task.is_finished() for i_task in task.inputs]):
+            return None
+        if self._collapse and isinstance(task.parent.action, _WhileBranch):
+            # Release the previous iteration.
+            branch = task.parent
+            branch.release_finished_childs()
+            branch.parent.release_finished_childs()
+            previous = branch.parent.parent
+            if previous is not None and isinstance(previous.action, _WhileBranch):
+                # Drop the bypassed tasks of the previous iteration, they are referenced
+                # by the child map of their parent and by the parent link of the next iteration.
+                del previous.childs['__result__']
+                branch.parent.parent = None
+        state_head, predicate_head, body_head = task.inputs
+        items, args = _state_args(state_head, task_creator)
+        predicate = task_creator('predicate', self.dynamic_action(predicate_head), args)
+        # Connect directly to the inputs of the heads to avoid long chains of heads.
+        branch = task_creator('__result__', _WhileBranch(self._iteration, self._collapse),
+                              [predicate] + [head.inputs[0] for head in task.inputs])
+        return [*items, predicate, branch]
+
+
+class _WhileBranch(MetaAction):
+    """
+    Auxiliary action of the While, the iteration after the predicate is evaluated.
+    """
+    def __init__(self, iteration: int, collapse: bool):
+        super().__init__("WhileBranch")
+        self.tail_call = True
+        self._iteration = iteration
+        self._collapse = collapse
+        self._parameters = Parameters()
+        self._parameters.append(ActionParameter(name="condition", type=bool))
+        self._parameters.append(ActionParameter(name="state", type=dtype.Any))
+        self._parameters.append(ActionParameter(name="predicate", type=dtype.Callable[..., bool]))
+        self._parameters.append(ActionParameter(name="body", type=dtype.Callable[..., dtype.Any]))
+        self._output_type = dtype.Any
+
+    def expand(self, task, task_creator):
+        if not all([i_task.is_finished() for i_task in task.inputs]):
+            return None
+        condition, state_head, predicate_head, body_head = task.inputs
+        if not condition.result:
+            return [task_creator('__result__', constructor.Pass(), [state_head])]
+        items, args = _state_args(state_head, task_creator)
+        body = task_creator('body', self.dynamic_action(body_head), args)
+        next_iteration = task_creator('__result__', While(self._iteration + 1, self._collapse),
+                                      [body, predicate_head.inputs[0], body_head.inputs[0]])
+        return [*items, body, next_iteration]
@@ -0,0 +1,104 @@
+"""
+Compilation of static workflows into a flat execution plan.
+
+The plan is an alternative to the Evaluation for repeated runs of the same small workflow.
+There are no tasks, no hashing and no result cache, the atomic actions are just called in
+a precomputed order on a flat list of values:
+- nested workflows are inlined
+- Value actions are folded into constants
+- Pass and result actions are resolved to their first input
+
+Only static workflows can be compiled, i.e. workflows without meta actions (DynamicCall, If, ...)
+whose expansion depends on the data.
+"""
+from typing import List, Any, Union
+
+from . import base, exceptions
+from .action_workflow import _Workflow, _Result
+from .evaluation import _evaluate_action
+from ..action.constructor import Value, Pass
+from ..code import wrap
+
+
+class ExecutionPlan:
+    """
+    Flat plan of a static workflow. The plan is recompiled automatically
+    if any of the inlined workflows is modified.
+    """
+    def __init__(self, workflow: _Workflow):
+        self.workflow = workflow
+        self._compile()
+
+    def _compile(self):
+        self.n_inputs = len(self.workflow.slots)
+        self._values = [None] * self.n_inputs
+        # Initial values: inputs followed by constants and placeholders of the step results.
+        self._steps = []
+        # List of (evaluate function, argument indices, result index).
+        self._workflows = []
+        # Inlined workflows and their versions, used to detect modifications.
+        self._result = self._inline(self.workflow, list(range(self.n_inputs)))
+
+    def _inline(self, workflow: _Workflow, slot_indices: List[int]) -> int:
+        self._workflows.append((workflow, workflow.version))
+        workflow_plan = workflow._compiled
+        if workflow_plan is None:
+            workflow_plan = workflow._compile()
+        indices = list(slot_indices)
+        for action_call, arg_indices in workflow_plan:
+            indices.append(self._add_call(action_call.action, [indices[i] for i in arg_indices]))
+        # The result call is the last one.
+        return indices[-1]
+
+    def _add_call(self, action: base._ActionBase, args: List[int]) -> int:
+        if isinstance(action, _Workflow):
+            return self._inline(action, args)
+        if action.task_type != base.TaskType.Atomic:
+            raise exceptions.ExcNotStaticWorkflow(
+                "Action {} of the workflow {} is not static.".format(action.name, self.workflow.name))
+        if isinstance(action, (_Result, Pass)):
+            return args[0]
+        i_value = len(self._values)
+        if isinstance(action, Value):
+            self._values.append(action.value)
+        else:
+            self._values.append(None)
+            self._steps.append((action.evaluate, tuple(args), i_value))
+        return i_value
+
+    @property
+    def n_steps(self):
+        return len(self._steps)
+
+    def is_valid(self):
+        return all(workflow.version == version for workflow, version in self._workflows)
+
+    def run(self, inputs: List[Any] = None) -> Any:
+        """
+        Evaluate the workflow for given input values.
+        """
+        if not self.is_valid():
+            self._compile()
+        if inputs is None:
+            inputs = []
+        assert len(inputs) == self.n_inputs
+        values = self._values.copy()
+        values[:self.n_inputs] = inputs
+        for evaluate, args, i_value in self._steps:
+            values[i_value] = _evaluate_action(evaluate, [values[i] for i in args])
+        return values[self._result]
+
+
+def compile(workflow: Union[_Workflow, wrap.ActionWrapper]) -> ExecutionPlan:
+    """
+    Compile a static workflow into a flat execution plan.
+    Raise ExcNotStaticWorkflow if the workflow contains a meta action.
+    Usage:
+        plan = compile(my_workflow)
+        result = plan.run([a, b])
+    """
+    if isinstance(workflow, wrap.ActionWrapper):
+        workflow = workflow.action
+    if not isinstance(workflow, _Workflow):
+        raise exceptions.ExcNotStaticWorkflow("Not a workflow: {}".format(workflow))
+    return ExecutionPlan(workflow)
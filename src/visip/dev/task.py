@@ -20,29 +20,40 @@ class Status(enum.IntEnum):
 
 
 class _TaskBase:
+    # Slots make the tasks compact, the DAG may have millions of tasks.
+    __slots__ = ('action', 'inputs', 'outputs', 'id', 'parent', 'child_id',
+                 'status', '_n_finished_inputs', '_result', '_result_hash', 'resource_id',
+                 'start_time', 'end_time', 'eval_time', 'critical_path')
 
     no_value = cache.ResultCache.NoValue
 
+    class Released:
+        """
+        Placeholder of the released result. The task is still finished, the value
+        can be retrieved from the result cache by the result hash.
+        """
+        pass
+
     def __init__(self, action: 'dev._ActionBase', inputs: List['Atomic'],
                  parent: '_TaskBase', task_name: str):
         self.action = action
         # Action (like function definition) of the task (like function call).
-        self.inputs = []
-        # Input tasks for the action's arguments.
+        self.inputs: Tuple['Atomic', ...] = tuple(inputs)
+        # Input tasks for the action's arguments. Tuple is replaced as a whole.
         self.outputs: List['Atomic'] = []
         # List of tasks dependent on the result. (Try to not use and eliminate.)
-        self.id: int = 0
-        # Task is identified by the hash of the hash of its parent task and its name within the parent.
         self.parent: Optional['Composed'] = parent
         # parent task
         self.child_id = None
         # name of current task within parent
-        self.id = int
-        # unique task hash
+        self.id: int = 0
+        # Task is identified by the hash of the hash of its parent task and its name within the parent.
         self._set_id(parent, task_name)
 
         self.status = Status.none
         # Status of the task, possibly need not to be stored explicitly.
+        self._n_finished_inputs = 0
+        # Number of leading inputs known to be finished, makes 'is_ready' checks amortized O(1).
         self._result: Any = self.no_value
         # The task result.
         self._result_hash = None
@@ -52,11 +63,12 @@ class _TaskBase:
         self.start_time = -1
         self.end_time = -1
         self.eval_time = 0
+        self.critical_path = 0
+        # Estimated time from the task start to the end of the known part of the DAG. Set by Scheduler.optimize.
 
         # Connect to inputs.
-        for input in inputs:
+        for input in self.inputs:
             assert isinstance(input, _TaskBase)
-            self.inputs.append(input)
             input.outputs.append(self)
 
 
@@ -66,7 +78,10 @@ class _TaskBase:
 
     @property
     def priority(self):
-        return 1
+        """
+        Default priority, tasks on the critical path first.
+        """
+        return self.critical_path
 
     @property
     def result(self):
@@ -95,6 +110,8 @@ class _TaskBase:
         :return:
         """
         assert result is not self.no_value
+        if self.action.rehash_result:
+            task_hash = data.hash(result)
         self.status = Status.finished
         self._result = result
         self._result_hash = task_hash
@@ -102,9 +119,40 @@ class _TaskBase:
     def is_finished(self):
         return self.result is not self.no_value
 
+    def release(self):
+        """
+        Drop the result value, keep the result hash.
+        """
+        assert self.is_finished()
+        self._result = _TaskBase.Released
+
+    def is_released(self):
+        return self.result is _TaskBase.Released
+
     def is_ready(self):
         assert False, "Not implemented."
 
+    def is_deferred(self):
+        """
+        True if all consumers are lazy inputs of composed tasks (see Composed.is_lazy_input),
+        the task need not to be evaluated (or expanded) yet.
+        """
+        outputs = self.outputs
+        return len(outputs) > 0 and all(isinstance(out, ComposedHead) and out.parent.is_lazy_input(out)
+                                        for out in outputs)
+
+    def detach_inputs(self) -> Tuple['_TaskBase', ...]:
+        """
+        Disconnect the task from its inputs, the task then has no inputs.
+        :return: The original inputs.
+        """
+        inputs = self.inputs
+        for input in inputs:
+            input.outputs.remove(self)
+        self.inputs = ()
+        self._n_finished_inputs = 0
+        return inputs
+
     def get_path(self):
         path = []
         t = self
@@ -122,7 +170,8 @@ class _TaskBase:
         self.id = data.hash(child_id, previous=parent_hash)
 
     def __lt__(self, other):
-        return self.priority < other.priority
+        # Higher priority first, ties broken by the task ID.
+        return (-self.priority, self.id) < (-other.priority, other.id)
 
     @staticmethod
     def _create_task(action, input_tasks, parent_task, child_name):
@@ -140,6 +189,7 @@ class _TaskBase:
 
 
 class Atomic(_TaskBase):
+    __slots__ = ()
 
 
     def is_ready(self):
@@ -148,8 +198,12 @@ class Atomic(_TaskBase):
         :return:
         """
         if self.status < Status.ready:
-            is_ready = all([task.is_finished() for task in self.inputs])
-            if is_ready:
+            inputs = self.inputs
+            i = self._n_finished_inputs
+            while i < len(inputs) and inputs[i].is_finished():
+                i += 1
+            self._n_finished_inputs = i
+            if i == len(inputs):
                 self.status = Status.ready
         return self.status == Status.ready
 
@@ -169,17 +223,26 @@ class ComposedHead(Atomic):
     Auxiliary task for the inputs of the composed task. Simplifies
     expansion as we need not to change input and output links of outer tasks, just link between head and tail.
     """
+    __slots__ = ()
+
+    _pass_action = constructor.Pass()
+    # Shared by all heads, the action has no state.
 
     @classmethod
     def create(cls, i, input_task, parent, name):
         if name is None:
             name = "__head_{}".format(i)
-        return cls(constructor.Pass(), [input_task], parent, name)
+        return cls(cls._pass_action, (input_task,), parent, name)
 
     @property
     def result(self):
         return self.inputs[0].result
 
+    @property
+    def result_hash(self):
+        # The head is finished with its input, possibly before its own evaluation.
+        return self.inputs[0].result_hash
+
 
 class Composed(Atomic):
     """
@@ -187,14 +250,22 @@ class Composed(Atomic):
     The Evaluation class takes care of their expansion during execution according to the
     preferences assigned by the Scheduler. It also keeps a map from
     """
+    __slots__ = ('time_estimate', 'childs')
 
     def __init__(self, action: 'dev._ActionBase', inputs: List['Atomic'],
                  parent: '_TaskBase', task_name: str):
         params = action.parameters
-        assert params.size() == len(inputs)
-        heads = [ComposedHead.create(i, input, parent, param.name)
-                                        for (i, input), param in zip(enumerate(inputs), params)]
-        super().__init__(action, heads, parent, task_name)
+        if params.is_variadic():
+            assert params.size() - 1 <= len(inputs)
+        else:
+            assert params.size() == len(inputs)
+        super().__init__(action, (), parent, task_name)
+        # Heads are children of the composed task, so that heads of different calls
+        # of the same action have distinct IDs.
+        self.inputs = tuple(ComposedHead.create(i, input, self, params.get_index(i).name)
+                            for i, input in enumerate(inputs))
+        for head in self.inputs:
+            head.outputs.append(self)
         self.time_estimate = 0
         # estimate of the start time, used as expansion priority
         self.childs: Atomic = None
@@ -228,12 +299,22 @@ class Composed(Atomic):
         return self.childs is not None
 
 
+    def is_lazy_input(self, head: ComposedHead) -> bool:
+        """
+        True if the input given by the 'head' may not be needed by the expansion,
+        e.g. the untaken branch of the If. Evaluation of its producer is deferred.
+        """
+        if self.is_expanded() or not hasattr(self.action, 'lazy_input'):
+            return False
+        return self.action.lazy_input(self, head)
+
     def create_child_task(self, name, action, inputs):
         return _TaskBase._create_task(action, inputs, self, name)
 
-    def expand(self):
+    def expand(self, guess=None):
         """
         Composed task expansion.
+        With 'guess' the speculative expansion of the action is used (see meta._If.speculate).
 
         Connect the head tasks to the body and the 'self' (i.e. the tail task) to the result
         action instance of the body. Auxiliary tasks for the heads, result and tail
@@ -241,24 +322,31 @@ class Composed(Atomic):
 
         :return:
             None if the expansion can not be performed, yet.
-            Dictionary of child tasks (action_instance_name -> task)
-            Empty dict is valid result, used to indicate end of a loop e.g. in the case of ForEach and While actions.
+            List of the new child tasks, see 'childs' for the map from child_id.
         """
         assert self.action.task_type == base.TaskType.Composed
         assert hasattr(self.action, 'expand')
 
         # Disconnect composed task heads.
-        heads = self.inputs.copy()
+        heads = self.inputs
         for head in heads:
             head.outputs = []
         # Generate and connect body tasks.
-        childs = self.action.expand(self, self.create_child_task)
-        if childs is not None:
-            self.childs = {task.child_id: task for task in childs}
+        if guess is None:
+            tasks = self.action.expand(self, self.create_child_task)
+        else:
+            tasks = self.action.speculate(self, self.create_child_task, guess)
+        if tasks is not None:
+            self.childs = {task.child_id: task for task in tasks}
             result_task = self.childs['__result__']
             assert len(result_task.outputs) == 0
             result_task.outputs.append(self)
-            self.inputs = [result_task]
+            self.inputs = (result_task,)
+            self._n_finished_inputs = 0
+            # Heads not used nor scheduled by the body need not to be kept by the outer tasks.
+            for head in heads:
+                if not head.outputs and self.childs.get(head.child_id, None) is not head:
+                    self._disconnect_head(head)
             # After expansion the composed task is just a dummy task dependent on the previoous result.
             # This works with Workflow, see how it will work with other composed actions:
             # if, reduce (for, while)
@@ -267,7 +355,75 @@ class Composed(Atomic):
             # No expansion: reconnect heads
             for head in heads:
                 head.outputs = [self]
-        return self.childs
+        return tasks
+
+    def collapse(self):
+        """
+        Release the expanded body of the finished task, only the result is kept.
+        The body tasks are disconnected, so they can be freed unless referenced elsewhere
+        (e.g. by the Scheduler if still not evaluated).
+        :return: List of the released child tasks.
+        """
+        assert self.is_finished()
+        childs = list(self.childs.values())
+        for child in childs:
+            child.outputs = []
+        self.childs = {}
+        self.inputs = ()
+        return childs
+
+    def eliminate_tail_call(self) -> Optional['Composed']:
+        """
+        Bypass the expanded task that is the only input of another composed task (its consumer),
+        both actions must allow the tail call elimination.
+        The result task is connected directly to the consumer, the bypassed task is never finished.
+        :return: The consumer or None if the task can not be bypassed.
+        """
+        if not self.action.tail_call or len(self.outputs) != 1:
+            return None
+        consumer = self.outputs[0]
+        if not (isinstance(consumer, Composed) and consumer.action.tail_call and consumer.inputs == (self,)):
+            return None
+        result_task, = self.inputs
+        result_task.outputs = [consumer]
+        consumer.inputs = (result_task,)
+        consumer._n_finished_inputs = 0
+        self.inputs = ()
+        self.outputs = []
+        return consumer
+
+    def release_finished_childs(self):
+        """
+        Release the finished child tasks except the result task, e.g. finished iterations of a loop.
+        Released tasks are disconnected from their inputs, so the tasks they depend on can be freed as well.
+        """
+        for name, child in list(self.childs.items()):
+            if name == '__result__' or not child.is_finished():
+                continue
+            if isinstance(child, Composed) and child.is_expanded():
+                child.collapse()
+            self._disconnect(child)
+            del self.childs[name]
+
+    @staticmethod
+    def _disconnect(task):
+        # Remove the task from outputs of its inputs, heads left without outputs are removed as well.
+        # Heads keep their input as they may be still scheduled.
+        for input in task.inputs:
+            if task in input.outputs:
+                input.outputs.remove(task)
+                if isinstance(input, ComposedHead) and not input.outputs:
+                    Composed._disconnect_head(input)
+        task.inputs = ()
+
+    @staticmethod
+    def _disconnect_head(head):
+        if not head.inputs:
+            # Already detached.
+            return
+        outputs = head.inputs[0].outputs
+        if head in outputs:
+            outputs.remove(head)
 
     def evaluate_fn(self):
         """
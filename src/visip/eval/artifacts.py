@@ -0,0 +1,149 @@
+import os
+import stat
+import shutil
+from typing import *
+import attr
+
+from ..action.std import FileIn
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, files are copied.
+    fcntl = None
+
+
+class ArtifactStore:
+    """
+    Content addressed store of the files referenced by the task results (FileIn), so that
+    a cached result can be used even if its files were deleted.
+
+    Files are stored under their content hash (FileIn.hash) as read-only objects,
+    the object keeps the modification time of the stored file.
+    A file is valid if it has the size and the modification time of its object. Missing files
+    are restored from the objects, changed files are never overwritten, the result is rather invalid.
+    Both storing and restoring use reflinks (copy on write clones) if supported by the file system,
+    restored files can be hard links to the objects (see 'hardlinks'), other files are copied.
+
+    Directory content:
+    - 'objects/<2 hex digits>/<32 hex digits>' - stored files
+    """
+    default_dir = ".visip_artifacts"
+    # Name of the store directory in the evaluation workspace.
+
+    _ficlone = 0x40049409
+    # Linux ioctl creating a reflink of a file.
+
+    def __init__(self, store_dir: str, hardlinks: bool = True):
+        """
+        :param store_dir: The store directory, created if necessary.
+        :param hardlinks: Restore files as hard links to the objects, if reflinks are not supported.
+        Restored files are then read-only and must not be modified in place.
+        """
+        self.store_dir = os.path.abspath(store_dir)
+        self.hardlinks = hardlinks
+        os.makedirs(os.path.join(self.store_dir, "objects"), exist_ok=True)
+        self.n_stored = 0
+        self.n_restored = 0
+
+    def object_path(self, file_hash: int) -> str:
+        name = "{:032x}".format(file_hash & ((1 << 128) - 1))
+        return os.path.join(self.store_dir, "objects", name[:2], name)
+
+    @staticmethod
+    def file_ins(value) -> Iterator[FileIn]:
+        """
+        Iterate over the FileIn objects in the data tree 'value'.
+        """
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, FileIn):
+                yield value
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                stack.extend(value)
+            elif isinstance(value, dict):
+                stack.extend(value.values())
+            elif attr.has(type(value)):
+                stack.extend(attr.astuple(value, recurse=False))
+
+    def store(self, value):
+        """
+        Store the files referenced by the data tree 'value', files already stored are skipped.
+        """
+        for file_in in self.file_ins(value):
+            obj_path = self.object_path(file_in.hash)
+            if os.path.isfile(obj_path) or not os.path.isfile(file_in.path):
+                continue
+            os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+            # Complete object appears at once, the store can be shared by concurrent evaluations.
+            tmp_path = "{}.{}.tmp".format(obj_path, os.getpid())
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+            self._clone(file_in.path, tmp_path)
+            shutil.copystat(file_in.path, tmp_path)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, obj_path)
+            self.n_stored += 1
+
+    def restore(self, value) -> bool:
+        """
+        Restore the missing files referenced by the data tree 'value'.
+        :return: False if a file has changed or it is missing and not stored, i.e. the value is not valid.
+        """
+        missing = {}
+        for file_in in self.file_ins(value):
+            obj_path = self.object_path(file_in.hash)
+            try:
+                file_stat = os.stat(file_in.path)
+            except FileNotFoundError:
+                if not os.path.isfile(obj_path):
+                    return False
+                missing[file_in.path] = obj_path
+                continue
+            try:
+                obj_stat = os.stat(obj_path)
+            except FileNotFoundError:
+                # Not stored, can not check the file.
+                continue
+            if file_stat.st_size != obj_stat.st_size or file_stat.st_mtime_ns != obj_stat.st_mtime_ns:
+                return False
+        for path, obj_path in missing.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._materialize(obj_path, path)
+            self.n_restored += 1
+        return True
+
+    def _materialize(self, obj_path, path):
+        if self._reflink(obj_path, path):
+            shutil.copystat(obj_path, path)
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+            return
+        if self.hardlinks:
+            try:
+                os.link(obj_path, path)
+                return
+            except OSError:
+                # Other file system.
+                pass
+        shutil.copyfile(obj_path, path)
+        shutil.copystat(obj_path, path)
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    def _clone(self, src, dst):
+        if not self._reflink(src, dst):
+            shutil.copyfile(src, dst)
+
+    @classmethod
+    def _reflink(cls, src, dst) -> bool:
+        if fcntl is None:
+            return False
+        # Never truncate an existing file, it may be a hard link to an object.
+        with open(src, 'rb') as f_src, open(dst, 'xb') as f_dst:
+            try:
+                fcntl.ioctl(f_dst.fileno(), cls._ficlone, f_src.fileno())
+                return True
+            except OSError:
+                pass
+        os.remove(dst)
+        return False
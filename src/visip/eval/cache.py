@@ -1,12 +1,29 @@
+import os
+import mmap
+import time
+import heapq
+import pickle
+import sqlite3
+import threading
+import collections
 from typing import *
+import numpy as np
+from ..dev import data
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, appends are not locked.
+    fcntl = None
 
 class ResultCache:
     """
     Trivial implementation of the task hash database.
     Possible improvements:
     - pemanent storage, store values in file, have only hashes in the memory
+      (see FileResultCache, SQLiteResultCache, TieredResultCache)
     - precise hash type
-    - safe also date of values, remove expired values
+    - safe also date of values, remove expired values (see SQLiteResultCache)
     """
     class NoValue:
         pass
@@ -17,5 +34,415 @@ class ResultCache:
     def value(self, hash_int:int) -> Any:
         return self.cache.get(hash_int, ResultCache.NoValue)
 
-    def insert(self, hash_int, value):
-        self.cache[hash_int] = value
\ No newline at end of file
+    def insert(self, hash_int, value, cost: float = None):
+        """
+        :param cost: Time to compute the value [s], used by the caches evicting the values.
+        """
+        self.cache[hash_int] = value
+
+    def insert_volatile(self, hash_int, value):
+        """
+        Insert a value kept in the memory only, replacing the previous value,
+        e.g. statistics of the evaluation.
+        """
+        self.cache[hash_int] = value
+
+    def close(self):
+        pass
+
+
+class BoundedResultCache(ResultCache):
+    """
+    In-memory result cache with limited size. Values are evicted as their total size
+    estimate (see data.size_estimate, the 'nbytes' for numpy arrays) exceeds 'max_bytes'.
+
+    Eviction policies:
+    - 'lru' - the least recently used value first
+    - 'cost' - the value with the smallest compute time per byte first (see 'cost' of 'insert'),
+      ties broken by LRU. Values with unknown cost are treated as the cheapest ones.
+
+    Counters 'n_hits', 'n_misses' and 'n_evictions' are provided for the cache tuning.
+    """
+    policies = ('lru', 'cost')
+
+    def __init__(self, max_bytes: int, policy: str = 'lru'):
+        super().__init__()
+        assert policy in self.policies, "Unknown eviction policy: {}".format(policy)
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.cache: collections.OrderedDict = collections.OrderedDict()
+        # Values in the LRU order, the least recently used first.
+        self._entries: Dict[int, Tuple[int, float, int]] = {}
+        # Map hash to (size, cost density, last use).
+        self._heap: List[Tuple[float, int, int]] = []
+        # Priority queue (cost density, last use, hash) of the 'cost' policy, outdated items are skipped.
+        self._n_uses = 0
+        self.n_bytes = 0
+        # Total size estimate of the cached values.
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_evictions = 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    def value(self, hash_int: int) -> Any:
+        value = self.cache.get(hash_int, ResultCache.NoValue)
+        if value is ResultCache.NoValue:
+            self.n_misses += 1
+        else:
+            self.n_hits += 1
+            self._touch(hash_int)
+        return value
+
+    def insert(self, hash_int, value, cost: float = None):
+        if hash_int in self.cache:
+            self._touch(hash_int)
+            return
+        size = data.size_estimate(value)
+        if size > self.max_bytes:
+            # Would evict everything else.
+            self.n_evictions += 1
+            return
+        density = 0.0 if cost is None else cost / max(size, 1)
+        self.cache[hash_int] = value
+        self._entries[hash_int] = (size, density, self._n_uses)
+        self.n_bytes += size
+        self._touch(hash_int)
+        self._evict()
+
+    def insert_volatile(self, hash_int, value):
+        self.remove(hash_int)
+        self.insert(hash_int, value)
+
+    def remove(self, hash_int):
+        """
+        Remove the value from the cache if present.
+        """
+        if hash_int in self.cache:
+            del self.cache[hash_int]
+            size, density, last_use = self._entries.pop(hash_int)
+            self.n_bytes -= size
+
+    def _touch(self, hash_int):
+        self.cache.move_to_end(hash_int)
+        self._n_uses += 1
+        if self.policy == 'cost':
+            size, density, last_use = self._entries[hash_int]
+            self._entries[hash_int] = (size, density, self._n_uses)
+            heapq.heappush(self._heap, (density, self._n_uses, hash_int))
+            if len(self._heap) > 2 * len(self._entries) + 16:
+                # Drop outdated items.
+                self._heap = [(density, last_use, h) for h, (size, density, last_use) in self._entries.items()]
+                heapq.heapify(self._heap)
+
+    def _evict(self):
+        while self.n_bytes > self.max_bytes:
+            if self.policy == 'lru':
+                hash_int = next(iter(self.cache))
+            else:
+                density, last_use, hash_int = heapq.heappop(self._heap)
+                entry = self._entries.get(hash_int, None)
+                if entry is None or entry[2] != last_use:
+                    continue
+            self.remove(hash_int)
+            self.n_evictions += 1
+
+
+class FileResultCache(ResultCache):
+    """
+    Persistent result cache stored in a directory. Only the hash index is kept in the memory,
+    the values are pickled into an append-only file read through 'mmap'.
+
+    Directory content:
+    - 'index' - append-only file of fixed size records (hash_lo, hash_hi, offset, size)
+    - 'values' - append-only file of the pickled values
+
+    The index is loaded by a single read into numpy arrays sorted by the hash,
+    values inserted during the session are kept in a dict. Values that can not be pickled
+    are kept in the memory only. Appends are serialized by a lock of the values file,
+    so the cache can be shared by concurrent evaluations.
+    The closed cache can still be used, the files are opened again when needed.
+    """
+    default_dir = ".visip_cache"
+    # Name of the cache directory in the evaluation workspace.
+
+    _record = np.dtype([('hash_lo', '<u8'), ('hash_hi', '<u8'), ('offset', '<u8'), ('size', '<u8')])
+    _mask_64 = (1 << 64) - 1
+
+    def __init__(self, cache_dir: str):
+        """
+        Open the cache in given directory, create the directory if necessary.
+        """
+        super().__init__()
+        self.cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index_path = os.path.join(self.cache_dir, "index")
+        self._values_path = os.path.join(self.cache_dir, "values")
+
+        self._load_index()
+        self._new: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        # Entries inserted during this session: (hash_lo, hash_hi) -> (offset, size)
+        self._index_file = None
+        self._values_file = None
+        # Append handles, opened by the first insert.
+        self._mmap = None
+        # Read only map of the values file, remapped when the file grows.
+
+    def _load_index(self):
+        with open(self._index_path, "ab+") as f:
+            f.seek(0)
+            content = f.read()
+        # Ignore incomplete last record.
+        n_records = len(content) // self._record.itemsize
+        index = np.frombuffer(content, dtype=self._record, count=n_records)
+        order = np.argsort(index['hash_lo'])
+        self._keys_lo = index['hash_lo'][order]
+        self._keys_hi = index['hash_hi'][order]
+        self._offsets = index['offset'][order]
+        self._sizes = index['size'][order]
+
+    @classmethod
+    def _split_hash(cls, hash_int: int) -> Tuple[int, int]:
+        return hash_int & cls._mask_64, (hash_int >> 64) & cls._mask_64
+
+    def __len__(self):
+        return len(self._keys_lo) + len(self._new) + len(self.cache)
+
+    def _find(self, key: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        location = self._new.get(key, None)
+        if location is not None:
+            return location
+        lo, hi = key
+        lo = np.uint64(lo)
+        i_begin = np.searchsorted(self._keys_lo, lo, side='left')
+        i_end = np.searchsorted(self._keys_lo, lo, side='right')
+        for i in range(i_begin, i_end):
+            if self._keys_hi[i] == hi:
+                return int(self._offsets[i]), int(self._sizes[i])
+        return None
+
+    def _read(self, offset: int, size: int) -> Any:
+        if self._mmap is None or offset + size > len(self._mmap):
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self._values_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with memoryview(self._mmap) as buffer:
+            return pickle.loads(buffer[offset:offset + size])
+
+    def value(self, hash_int: int) -> Any:
+        value = self.cache.get(hash_int, ResultCache.NoValue)
+        if value is not ResultCache.NoValue:
+            return value
+        location = self._find(self._split_hash(hash_int))
+        if location is None:
+            return ResultCache.NoValue
+        return self._read(*location)
+
+    def insert(self, hash_int, value, cost: float = None):
+        key = self._split_hash(hash_int)
+        if self._find(key) is not None:
+            return
+        try:
+            stream = pickle.dumps(value)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            # Can not be stored, keep in the memory.
+            self.cache[hash_int] = value
+            return
+        if self._values_file is None:
+            self._index_file = open(self._index_path, "ab")
+            self._values_file = open(self._values_path, "ab")
+        if fcntl is not None:
+            fcntl.flock(self._values_file.fileno(), fcntl.LOCK_EX)
+        try:
+            offset = self._values_file.seek(0, os.SEEK_END)
+            self._values_file.write(stream)
+            self._values_file.flush()
+            record = np.array([(key[0], key[1], offset, len(stream))], dtype=self._record)
+            self._index_file.write(record.tobytes())
+            self._index_file.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._values_file.fileno(), fcntl.LOCK_UN)
+        self._new[key] = (offset, len(stream))
+
+    def close(self):
+        """
+        Close the files, can be called repeatedly.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._values_file is not None:
+            self._index_file.close()
+            self._values_file.close()
+            self._index_file = None
+            self._values_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SQLiteResultCache(ResultCache):
+    """
+    Persistent result cache in a SQLite database file, can be shared by concurrent evaluations
+    (processes) on the same host. The database uses the WAL journal, so readers are not blocked by a writer.
+
+    Values are pickled, inserted values are written in batches of 'batch_size' by a single transaction.
+    Every entry has the time of the insertion, entries older than 'max_age' are not used
+    and can be deleted by 'expire'. Values that can not be pickled are kept in the memory only.
+    """
+    default_file = "visip_cache.sqlite"
+    # Name of the database file in the evaluation workspace.
+
+    _mask_128 = (1 << 128) - 1
+
+    def __init__(self, db_path: str, batch_size: int = 64, max_age: float = None, timeout: float = 60.0):
+        """
+        :param db_path: The database file, created if necessary.
+        :param max_age: Maximal age of the used entries [s], no limit by default.
+        :param timeout: Time to wait for the database locked by other evaluation [s].
+        """
+        super().__init__()
+        self.db_path = os.path.abspath(db_path)
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.timeout = timeout
+        self._local = threading.local()
+        # Connection of the thread, SQLite connections can not be shared by threads nor forked processes.
+        # Opened again when the closed cache is used.
+        self._connection()
+        self._pending: Dict[bytes, Tuple[bytes, float]] = {}
+        # Inserted entries not written yet: key -> (pickled value, time)
+
+    def _connection(self) -> sqlite3.Connection:
+        if getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS results "
+                       "(hash BLOB PRIMARY KEY, value BLOB NOT NULL, time REAL NOT NULL)")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    @classmethod
+    def _key(cls, hash_int: int) -> bytes:
+        return (hash_int & cls._mask_128).to_bytes(16, 'little')
+
+    def __len__(self):
+        n_stored, = self._connection().execute("SELECT COUNT(*) FROM results").fetchone()
+        return n_stored + len(self._pending) + len(self.cache)
+
+    def value(self, hash_int: int) -> Any:
+        value = self.cache.get(hash_int, ResultCache.NoValue)
+        if value is not ResultCache.NoValue:
+            return value
+        key = self._key(hash_int)
+        entry = self._pending.get(key, None)
+        if entry is None:
+            entry = self._connection().execute("SELECT value, time FROM results WHERE hash = ?", (key,)).fetchone()
+            if entry is None:
+                return ResultCache.NoValue
+        stream, insert_time = entry
+        if self.max_age is not None and insert_time < time.time() - self.max_age:
+            return ResultCache.NoValue
+        return pickle.loads(stream)
+
+    def insert(self, hash_int, value, cost: float = None):
+        try:
+            stream = pickle.dumps(value)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            # Can not be stored, keep in the memory.
+            self.cache[hash_int] = value
+            return
+        self._pending[self._key(hash_int)] = (stream, time.time())
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending entries in a single transaction.
+        """
+        if not self._pending:
+            return
+        entries = [(key, stream, insert_time) for key, (stream, insert_time) in self._pending.items()]
+        db = self._connection()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany("INSERT OR REPLACE INTO results (hash, value, time) VALUES (?, ?, ?)", entries)
+        self._pending = {}
+
+    def expire(self, max_age: float = None) -> int:
+        """
+        Delete entries older then 'max_age' [s], the 'max_age' of the cache by default.
+        :return: Number of deleted entries.
+        """
+        if max_age is None:
+            max_age = self.max_age
+        assert max_age is not None
+        self.flush()
+        db = self._connection()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            cursor = db.execute("DELETE FROM results WHERE time < ?", (time.time() - max_age,))
+        return cursor.rowcount
+
+    def close(self):
+        """
+        Write the pending entries and close the connection of the calling thread, can be called repeatedly.
+        """
+        self.flush()
+        if getattr(self._local, 'pid', None) == os.getpid():
+            self._local.db.close()
+            self._local.pid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TieredResultCache(ResultCache):
+    """
+    Bounded in-memory cache in front of a persistent cache (e.g. SQLiteResultCache).
+    Values are read through the memory tier, values found in the persistent tier are promoted
+    to the memory tier. Inserted values are written to both tiers, volatile values to the memory tier only.
+    """
+    def __init__(self, back: ResultCache, max_bytes: int = 1 << 30, policy: str = 'lru'):
+        """
+        :param back: The persistent tier.
+        :param max_bytes: Size of the memory tier, see BoundedResultCache.
+        """
+        super().__init__()
+        self.front = BoundedResultCache(max_bytes, policy)
+        self.back = back
+
+    def value(self, hash_int: int) -> Any:
+        value = self.front.value(hash_int)
+        if value is ResultCache.NoValue:
+            value = self.back.value(hash_int)
+            if value is not ResultCache.NoValue:
+                self.front.insert(hash_int, value)
+        return value
+
+    def insert(self, hash_int, value, cost: float = None):
+        self.front.insert(hash_int, value, cost=cost)
+        self.back.insert(hash_int, value, cost=cost)
+
+    def insert_volatile(self, hash_int, value):
+        self.front.insert_volatile(hash_int, value)
+
+    def close(self):
+        self.back.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
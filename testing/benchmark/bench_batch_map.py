@@ -0,0 +1,63 @@
+"""
+Benchmark of the batched map over a parameter sweep: a separate task per sample
+against 'batch_map' of the same action, vectorized or evaluated per item in chunks.
+
+Usage:
+    python bench_batch_map.py [n_samples]
+"""
+import sys
+import time
+import numpy as np
+
+import visip as wf
+from visip.dev import evaluation
+
+
+def law(a, b):
+    return np.sqrt(a * a + b * b) * np.exp(-a)
+
+
+@wf.action_def
+def law_scalar(a: float, b: float) -> float:
+    return law(a, b)
+
+
+@wf.action_def(vectorized=True)
+def law_vectorized(a: float, b: float) -> float:
+    return law(a, b)
+
+
+def make_per_task(n_samples):
+    @wf.workflow
+    def per_task(self, a_list, b_list):
+        return [law_scalar(a_list[i], b_list[i]) for i in range(n_samples)]
+    return per_task
+
+
+@wf.workflow
+def batched(self, a_list, b_list):
+    return wf.batch_map(law_scalar, 1000, a_list, b_list)
+
+
+@wf.workflow
+def vectorized(self, a_list, b_list):
+    return wf.batch_map(law_vectorized, 1000, a_list, b_list)
+
+
+def bench(name, workflow, inputs, n_samples):
+    start = time.perf_counter()
+    result = evaluation.run(workflow, inputs)
+    run_time = time.perf_counter() - start
+    assert len(result) == n_samples
+    print("{:>12} {:>10} {:>10.3f} {:>16.2f}".format(name, n_samples, run_time, run_time / n_samples * 1e6))
+    return result
+
+
+if __name__ == "__main__":
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    a_list = list(np.linspace(0, 1, n_samples))
+    b_list = list(np.linspace(1, 2, n_samples))
+    print("{:>12} {:>10} {:>10} {:>16}".format("", "n_samples", "time [s]", "per sample [us]"))
+    reference = bench("per task", make_per_task(n_samples), [a_list, b_list], n_samples)
+    assert np.allclose(bench("batch_map", batched, [a_list, b_list], n_samples), reference)
+    assert np.allclose(bench("vectorized", vectorized, [a_list, b_list], n_samples), reference)
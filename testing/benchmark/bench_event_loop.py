@@ -0,0 +1,51 @@
+"""
+Benchmark of the Evaluation loop with asynchronous resources:
+- CPU time of the scheduler during a long running task
+- completion latency, i.e. overhead per task of a chain of short sleeping tasks
+
+Usage:
+    python bench_event_loop.py
+"""
+import time
+
+import visip as wf
+from visip.dev import evaluation
+
+
+@wf.action_def
+def sleep(a: int, duration: float) -> int:
+    time.sleep(duration)
+    return a + 1
+
+
+@wf.workflow
+def long_task(self, duration):
+    return sleep(0, duration)
+
+
+@wf.workflow
+def chain(self, duration):
+    a = 0
+    for i in range(50):
+        a = sleep(a, duration)
+    return a
+
+
+def run(workflow, duration):
+    with evaluation.ThreadPoolResource(n_threads=4) as resource:
+        scheduler = evaluation.Scheduler([resource])
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        evaluation.run(workflow, [duration], scheduler=scheduler)
+        return time.perf_counter() - start, time.process_time() - cpu_start
+
+
+if __name__ == "__main__":
+    duration = 5.0
+    wall, cpu = run(long_task, duration)
+    print("single task {:.1f} s: wall {:.3f} s, CPU {:.3f} s ({:.2f} %)"
+          .format(duration, wall, cpu, cpu / wall * 100))
+    duration = 0.01
+    wall, cpu = run(chain, duration)
+    print("chain of 50 x {:.3f} s: wall {:.3f} s, overhead per task {:.3f} ms"
+          .format(duration, wall, (wall - 50 * duration) / 50 * 1e3))
@@ -0,0 +1,47 @@
+"""
+Benchmark of the workflow expansion, e.g. a workflow called in a loop.
+Time per expansion of a workflow with a chain of 'n_calls' action calls.
+
+Usage:
+    python bench_expand.py
+"""
+import time
+
+import visip as wf
+from visip.dev import task as task_mod
+from visip.action import constructor
+
+
+@wf.action_def
+def add(a: float, b: float) -> float:
+    return a + b
+
+
+def make_workflow(n_calls):
+    @wf.workflow
+    def chain(self, a, b):
+        x = a
+        for i in range(n_calls):
+            x = add(x, b)
+        return x
+    return chain.action
+
+
+def run(n_calls, n_expansions):
+    workflow = make_workflow(n_calls)
+    parent = task_mod.Atomic(constructor.Pass(), [], None, '__root__')
+    a = task_mod.Atomic(constructor.Pass(), [], parent, 'a')
+    b = task_mod.Atomic(constructor.Pass(), [], parent, 'b')
+    tasks = [task_mod.Composed(workflow, [a, b], parent, i) for i in range(n_expansions)]
+    start = time.perf_counter()
+    for task in tasks:
+        task.expand()
+    expand_time = time.perf_counter() - start
+    print("{:>8} {:>10} {:>18.1f} {:>16.2f}".format(
+        n_calls, n_expansions, expand_time / n_expansions * 1e6, expand_time / n_expansions / n_calls * 1e6))
+
+
+if __name__ == "__main__":
+    print("{:>8} {:>10} {:>18} {:>16}".format("n_calls", "n_expand", "expand [us]", "per call [us]"))
+    for n_calls in [5, 50]:
+        run(n_calls, 10000)
@@ -0,0 +1,46 @@
+"""
+Benchmark of the FileResultCache:
+- time to open a cache with millions of entries
+- time of the value lookup
+
+Usage:
+    python bench_file_cache.py [n_entries]
+"""
+import sys
+import time
+import random
+import tempfile
+
+from visip.eval import cache
+
+
+def bench_file_cache(n_entries):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        keys = [random.getrandbits(128) for i in range(n_entries)]
+        start = time.perf_counter()
+        with cache.FileResultCache(cache_dir) as file_cache:
+            for i, key in enumerate(keys):
+                file_cache.insert(key, i)
+        insert_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        file_cache = cache.FileResultCache(cache_dir)
+        open_time = time.perf_counter() - start
+
+        sample = random.sample(keys, min(n_entries, 10000))
+        start = time.perf_counter()
+        for key in sample:
+            assert file_cache.value(key) is not cache.ResultCache.NoValue
+        lookup_time = (time.perf_counter() - start) / len(sample)
+        file_cache.close()
+
+    print("entries: {:10d}  insert: {:8.2f} us/entry  open: {:8.3f} s  lookup: {:8.2f} us"
+          .format(n_entries, insert_time / n_entries * 1e6, open_time, lookup_time * 1e6))
+
+
+if __name__ == "__main__":
+    n_max = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    n = 10000
+    while n <= n_max:
+        bench_file_cache(n)
+        n *= 10
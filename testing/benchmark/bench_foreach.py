@@ -0,0 +1,48 @@
+"""
+Benchmark of the ForEach expansion: mapping a workflow over a large list.
+The maximal number of tasks waiting in the scheduler shows that the expansion is streamed.
+
+Usage:
+    python bench_foreach.py [n_items]
+"""
+import sys
+import time
+import resource
+
+import visip as wf
+from visip.dev import evaluation
+
+
+@wf.action_def
+def square(a: float) -> float:
+    return a * a
+
+
+@wf.workflow
+def body(self, a):
+    return square(a)
+
+
+@wf.workflow
+def map_body(self, items):
+    return wf.foreach(body, items)
+
+
+class Scheduler(evaluation.Scheduler):
+    max_tasks = 0
+
+    def append(self, tasks):
+        super().append(tasks)
+        self.max_tasks = max(self.max_tasks, self.n_assigned_tasks)
+
+
+if __name__ == "__main__":
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    scheduler = Scheduler([evaluation.Resource()])
+    start = time.perf_counter()
+    result = evaluation.run(map_body, [list(range(n_items))], scheduler=scheduler)
+    run_time = time.perf_counter() - start
+    assert result[-1] == (n_items - 1) ** 2
+    print("n_items: {}  time: {:.2f} s  per item: {:.1f} us  max scheduled tasks: {}  peak RSS: {:.0f} MB".format(
+        n_items, run_time, run_time / n_items * 1e6, scheduler.max_tasks,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
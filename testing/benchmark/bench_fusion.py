@@ -0,0 +1,70 @@
+"""
+Benchmark of the task fusion (Evaluation 'fuse_tasks'): number of tasks submitted to the resources
+and the wall time with and without fusion. The workflow mimics 'testing/action/wf_complex.py'
+(constants, tuples, dicts, item selection, nested workflow) with cheap Python actions in place of the
+'system' calls, called 'n_calls' times.
+
+Usage:
+    python bench_fusion.py [n_calls]
+"""
+import sys
+import time
+
+import visip as wf
+from visip.dev import evaluation
+
+
+n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+
+@wf.action_def
+def mesh(geometry: str, step: float) -> str:
+    return "{}_{}.msh".format(geometry, step)
+
+
+@wf.action_def
+def flow(config: wf.Any) -> int:
+    return len(config['MESH'])
+
+
+@wf.workflow
+def mesh_run(self, geometry, step):
+    self.args = (geometry, "-2", "-clscale", step, "-format", "msh2")
+    self.mesh_file = mesh(self.args[0], self.args[3])
+    self.joined = (self.mesh_file, self.args)
+    return self.joined[0]
+
+
+@wf.workflow
+def simple_wf(self, step):
+    self.mesh = mesh_run('square.geo', step)
+    self.config = dict(MESH=self.mesh, STEP=step)
+    return flow(self.config)
+
+
+def make_analysis():
+    @wf.analysis
+    def sweep(self):
+        return [simple_wf(0.01 * i) for i in range(n_calls)]
+    return sweep
+
+
+class CountingResource(evaluation.Resource):
+    n_submitted = 0
+
+    def submit(self, task):
+        self.n_submitted += 1
+        super().submit(task)
+
+
+if __name__ == "__main__":
+    analysis = make_analysis()
+    print("{:>10} {:>10} {:>12}".format("fuse", "time [s]", "submitted"))
+    for fuse_tasks in [False, True]:
+        resource = CountingResource()
+        start = time.perf_counter()
+        result = evaluation.run(analysis, [], scheduler=evaluation.Scheduler([resource], n_tasks_limit=10**6),
+                                fuse_tasks=fuse_tasks)
+        run_time = time.perf_counter() - start
+        assert len(result) == n_calls
+        print("{:>10} {:>10.2f} {:>12}".format(str(fuse_tasks), run_time, resource.n_submitted))
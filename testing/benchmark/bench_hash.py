@@ -0,0 +1,55 @@
+"""
+Benchmark of data.hash against the previous implementation 'hash(str(data))'.
+Note that the previous implementation is salted per process and the 'str' of large numpy
+arrays is abbreviated, so different arrays may get the same hash.
+
+Usage:
+    python bench_hash.py
+"""
+import time
+import attr
+import numpy as np
+
+from visip.dev import data
+
+
+def legacy_hash(x, previous=0):
+    return hash((str(x), previous))
+
+
+@attr.s(auto_attribs=True)
+class Point:
+    x: float
+    y: float
+    label: str
+
+
+def measure(fn, value, min_time=0.2):
+    n_calls = 0
+    start = time.perf_counter()
+    while True:
+        fn(value)
+        n_calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed > min_time:
+            return elapsed / n_calls
+
+
+cases = [
+    ("int", 123456),
+    ("str (20 chars)", "some_action_instance"),
+    ("attrs record", Point(1.0, 2.0, "a")),
+    ("list of 1e4 floats", [float(i) for i in range(10000)]),
+    ("dict of 1e3 items", {str(i): i for i in range(1000)}),
+    ("list of 1e3 records", [Point(i, i, str(i)) for i in range(1000)]),
+    ("ndarray 1e6 float64", np.random.rand(1000000)),
+    ("ndarray 1e7 float64", np.random.rand(10000000)),
+    ("ndarray 1e6 strided", np.random.rand(2000000)[::2]),
+]
+
+if __name__ == "__main__":
+    print("{:24s} {:>14s} {:>14s}".format("case", "legacy [us]", "data.hash [us]"))
+    for name, value in cases:
+        t_legacy = measure(legacy_hash, value)
+        t_new = measure(data.hash, value)
+        print("{:24s} {:14.2f} {:14.2f}".format(name, t_legacy * 1e6, t_new * 1e6))
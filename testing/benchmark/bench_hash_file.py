@@ -0,0 +1,60 @@
+"""
+Benchmark of the file hashing: the previous read in 64 KiB chunks, the 'mmap' stream,
+the parallel tree hash and the lookup in the FileHashIndex of an unchanged file.
+
+Usage:
+    python bench_hash_file.py [size_mb]
+"""
+import os
+import sys
+import time
+import hashlib
+import tempfile
+
+from visip.dev import data
+
+
+size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+
+def legacy_hash_file(file_path):
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            sha1.update(chunk)
+    return data.hash(sha1.digest())
+
+
+def measure(fn, path):
+    start = time.perf_counter()
+    result = fn(path)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "file.bin")
+        with open(path, "wb") as f:
+            for i in range(size_mb):
+                f.write(os.urandom(1 << 20))
+        # Old enough to be indexed.
+        old_time = os.stat(path).st_mtime_ns - 10**10
+        os.utime(path, ns=(old_time, old_time))
+        index = data.FileHashIndex(os.path.join(tmp_dir, "index.sqlite"))
+
+        print("{:>16} {:>10} {:>10}".format("method", "time [s]", "MB/s"))
+        methods = [("read 64 KiB", legacy_hash_file), ("mmap stream", data.hash_file_stream)]
+        for n_threads in [1, 2, 4, 8]:
+            methods.append(("tree, {} threads".format(n_threads),
+                            lambda path, n=n_threads: data.hash_file_tree(path, n_threads=n)))
+        methods.extend([("index, first", index.hash_file), ("index, cached", index.hash_file)])
+        results = set()
+        for name, fn in methods:
+            result, run_time = measure(fn, path)
+            results.add(result)
+            print("{:>16} {:>10.3f} {:>10.0f}".format(name, run_time, size_mb / run_time))
+        # Stream and tree hash.
+        assert len(results) == 2
@@ -0,0 +1,57 @@
+"""
+Benchmark of the speculative If: slow condition and slow branches evaluated by two threads.
+Latency without speculation, with the right guess and with the wrong guess.
+
+Usage:
+    python bench_if.py
+"""
+import time
+
+import visip as wf
+from visip.code import wrap
+from visip.dev import evaluation, meta
+
+
+@wf.action_def
+def slow_condition(x: int) -> bool:
+    time.sleep(0.2)
+    return x > 0
+
+
+@wf.action_def
+def slow_branch(value: int) -> int:
+    time.sleep(0.2)
+    return value
+
+
+@wf.workflow
+def branch_plus(self):
+    return slow_branch(1)
+
+
+@wf.workflow
+def branch_minus(self):
+    return slow_branch(-1)
+
+
+likely_if = wrap.public_action(meta._If(likely=True))
+
+
+@wf.workflow
+def analysis(self, x):
+    return likely_if(slow_condition(x), branch_plus, branch_minus)
+
+
+def run(x, speculative):
+    # Fresh resource, no cached results.
+    scheduler = evaluation.Scheduler([evaluation.ThreadPoolResource(2)])
+    start = time.perf_counter()
+    result = evaluation.run(analysis, [x], scheduler=scheduler, speculative=speculative)
+    assert result == (1 if x > 0 else -1)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print("{:>12} {:>12} {:>10}".format("speculative", "guess", "time [s]"))
+    for speculative, x, guess in [(False, 1, "-"), (True, 1, "right"), (True, -1, "wrong")]:
+        print("{:>12} {:>12} {:>10.2f}".format(str(speculative), guess, run(x, speculative)))
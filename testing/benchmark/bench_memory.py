@@ -0,0 +1,71 @@
+"""
+Benchmark of the memory aware expansion: peak RSS of a large fan-out workflow.
+Every sample produces a temporary array, that is reduced to a single float.
+
+Usage:
+    python bench_memory.py [n_samples memory_limit_MB persistent_cache keep_results]
+
+Without the memory limit all sample subtasks are kept until the end of the evaluation.
+The results are kept by the in memory ResultCache of the resource anyway, so the persistent cache is used
+to see the effect of the memory limit and of the release of results. Every variant is run in a separate process in order to measure its peak RSS.
+"""
+import sys
+import time
+import tempfile
+import resource
+import subprocess
+import numpy as np
+
+import visip as wf
+from visip.dev import evaluation
+
+
+@wf.action_def
+def generate(i: int) -> np.ndarray:
+    return np.full(1000, float(i))
+
+
+@wf.action_def
+def mean(x: np.ndarray) -> float:
+    return float(np.mean(x))
+
+
+@wf.workflow
+def sample(self, i):
+    self.x = generate(i)
+    return mean(self.x)
+
+
+def make_analysis(n_samples):
+    @wf.analysis
+    def fan_out(self):
+        return [sample(i) for i in range(n_samples)]
+    return fan_out
+
+
+def run(n_samples, memory_limit, persistent_cache, keep_results):
+    analysis = make_analysis(n_samples)
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workspace:
+        result = evaluation.run(analysis, memory_limit=memory_limit,
+                                persistent_cache=persistent_cache, keep_results=keep_results,
+                                workspace=workspace)
+    assert result[-1] == n_samples - 1
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("{:>10} {:>10} {:>8} {:>8} {:10.2f} {:14.1f}".format(
+        n_samples, str(memory_limit and memory_limit // 2**20), str(persistent_cache), str(keep_results),
+        time.perf_counter() - start, peak_rss))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 4:
+        limit = int(sys.argv[2]) * 2**20 if int(sys.argv[2]) > 0 else None
+        run(int(sys.argv[1]), limit, sys.argv[3] == "True", sys.argv[4] == "True")
+        sys.exit()
+    print("{:>10} {:>10} {:>8} {:>8} {:>10} {:>14}".format(
+        "n_samples", "limit [MB]", "file", "keep", "time [s]", "peak RSS [MB]"))
+    variants = [(0, False, True), (0, True, True), (0, True, False), (64, True, True), (64, True, False)]
+    for n_samples in [10000, 50000]:
+        for limit_mb, persistent_cache, keep_results in variants:
+            subprocess.run([sys.executable, __file__, str(n_samples), str(limit_mb),
+                            str(persistent_cache), str(keep_results)], check=True)
@@ -0,0 +1,51 @@
+"""
+Benchmark of the compiled execution plan against the evaluation for
+repeated runs of a small workflow with different inputs.
+
+Usage:
+    python bench_plan.py [n_runs]
+"""
+import sys
+import time
+
+import visip as wf
+from visip.dev import evaluation
+
+
+@wf.action_def
+def add(a: float, b: float) -> float:
+    return a + b
+
+
+@wf.action_def
+def mult(a: float, b: float) -> float:
+    return a * b
+
+
+@wf.workflow
+def axpy(self, a, x, y):
+    return add(mult(a, x), y)
+
+
+@wf.workflow
+def poly(self, x):
+    self.y = axpy(2, x, 1)
+    return axpy(x, self.y, 3)
+
+
+def bench(name, fn, n_runs):
+    start = time.perf_counter()
+    for i in range(n_runs):
+        fn(i)
+    run_time = time.perf_counter() - start
+    print("{:>12} {:>8} {:>14.1f}".format(name, n_runs, run_time / n_runs * 1e6))
+    return run_time
+
+
+if __name__ == "__main__":
+    n_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print("{:>12} {:>8} {:>14}".format("", "n_runs", "time [us/run]"))
+    t_eval = bench("evaluation", lambda x: evaluation.run(poly, [x]), n_runs)
+    plan = wf.compile(poly)
+    t_plan = bench("plan", lambda x: plan.run([x]), n_runs)
+    print("speedup: {:.0f}x".format(t_eval / t_plan))
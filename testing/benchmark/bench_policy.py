@@ -0,0 +1,124 @@
+"""
+Makespan of the Scheduler policies on synthetic DAGs.
+Simulated evaluation: a resource with 'n_threads' slots, task durations are exactly the eval_time estimates,
+the simulated clock advances to the next task completion.
+
+Usage:
+    python bench_policy.py
+"""
+import heapq
+import random
+
+from visip.dev import evaluation, task as task_mod
+from visip.action import constructor
+
+
+class SimulatedResource(evaluation.Resource):
+    def __init__(self, n_threads):
+        super().__init__()
+        self.n_threads = n_threads
+        self.time = 0.0
+        self._running = []
+
+    def can_accept(self):
+        return len(self._running) < self.n_threads
+
+    @property
+    def n_running(self):
+        return len(self._running)
+
+    def submit(self, task):
+        heapq.heappush(self._running, (self.time + task.eval_time, id(task), task))
+
+    def get_finished(self):
+        # Scheduler submits all ready tasks before the next call, so we can advance the clock.
+        if not self._running:
+            return []
+        self.time = self._running[0][0]
+        finished = []
+        while self._running and self._running[0][0] <= self.time:
+            _, _, task = heapq.heappop(self._running)
+            task.finish(result=None, task_hash=task.id)
+            finished.append(task)
+        return finished
+
+
+def layered_dag(n_layers, width, seed):
+    """
+    Random layered DAG, heavy tailed durations.
+    """
+    rnd = random.Random(seed)
+    action = constructor.A_list()
+    tasks = []
+    previous = []
+    for i_layer in range(n_layers):
+        layer = []
+        for i in range(rnd.randint(1, width)):
+            n_inputs = min(len(previous), rnd.randint(1, 3))
+            inputs = rnd.sample(previous, n_inputs)
+            task = task_mod.Atomic(action, inputs, None, "{}_{}".format(i_layer, i))
+            task.eval_time = rnd.lognormvariate(0, 1)
+            layer.append(task)
+        tasks.extend(layer)
+        previous = layer + rnd.sample(previous, min(len(previous), 2))
+    return tasks
+
+
+def independent_chains(n_chains, seed):
+    """
+    Chains of different length plus many short independent tasks.
+    """
+    rnd = random.Random(seed)
+    action = constructor.A_list()
+    tasks = []
+    for i_chain in range(n_chains):
+        previous = []
+        for i in range(rnd.choice([1, 1, 1, 2, 10])):
+            task = task_mod.Atomic(action, previous, None, "{}_{}".format(i_chain, i))
+            task.eval_time = rnd.uniform(0.5, 1.5)
+            tasks.append(task)
+            previous = [task]
+    return tasks
+
+
+def makespan(tasks, policy, n_threads):
+    resource = SimulatedResource(n_threads)
+    scheduler = evaluation.Scheduler([resource], n_tasks_limit=len(tasks) + 1, policy=policy)
+    scheduler.append(tasks)
+    scheduler.optimize()
+    while scheduler.n_assigned_tasks or scheduler.n_running_tasks:
+        scheduler.update()
+    return resource.time
+
+
+policies = [
+    ("FIFO", lambda: evaluation.FIFOPolicy()),
+    ("LPT", lambda: evaluation.LPTPolicy()),
+    ("critical path", lambda: evaluation.CriticalPathPolicy()),
+    ("slack", lambda: evaluation.SlackPolicy()),
+    ("user (random)", lambda: evaluation.UserPriorityPolicy(lambda task: random.random())),
+]
+
+dags = [
+    ("layered 50x40", lambda seed: layered_dag(50, 40, seed)),
+    ("chains 300", lambda seed: independent_chains(300, seed)),
+]
+
+if __name__ == "__main__":
+    n_threads = 8
+    n_seeds = 5
+    print("Average makespan relative to the lower bound max(critical path, work / n_threads), {} threads."
+          .format(n_threads))
+    print("{:16s}".format("policy") + "".join("{:>16s}".format(name) for name, _ in dags))
+    for policy_name, make_policy in policies:
+        line = "{:16s}".format(policy_name)
+        for dag_name, make_dag in dags:
+            ratio = 0
+            for seed in range(n_seeds):
+                tasks = make_dag(seed)
+                time = makespan(tasks, make_policy(), n_threads)
+                lower_bound = max(max(t.critical_path for t in tasks),
+                                  sum(t.eval_time for t in tasks) / n_threads)
+                ratio += time / lower_bound / n_seeds
+            line += "{:16.3f}".format(ratio)
+        print(line)
@@ -0,0 +1,71 @@
+"""
+Benchmark of the Reduce: sum of many large arrays produced by the sample tasks.
+Compared to the single action summing the list of all samples.
+
+Usage:
+    python bench_reduce.py [n_samples variant policy]
+
+The results are released (keep_results=False) and stored by the persistent cache,
+so the peak RSS depends on the number of results waiting for their consumers.
+The samples are evaluated by two threads, the LIFOPolicy combines the samples as soon as they are ready.
+Every variant is run in a separate process in order to measure its peak RSS.
+"""
+import sys
+import time
+import tempfile
+import resource
+import subprocess
+import numpy as np
+
+import visip as wf
+from visip.dev import evaluation
+
+
+@wf.action_def
+def generate(i: int) -> np.ndarray:
+    return np.full(2**17, float(i))
+
+
+@wf.action_def(associative=True)
+def add(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return a + b
+
+
+@wf.action_def
+def total(items: wf.List[np.ndarray]) -> np.ndarray:
+    return np.sum(items, axis=0)
+
+
+def make_analysis(n_samples, variant):
+    @wf.analysis
+    def reduce_samples(self):
+        samples = [generate(i) for i in range(n_samples)]
+        if variant == "reduce":
+            return wf.reduce(add, samples)
+        return total(samples)
+    return reduce_samples
+
+
+def run(n_samples, variant, policy):
+    analysis = make_analysis(n_samples, variant)
+    policy = getattr(evaluation, policy)()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workspace:
+        scheduler = evaluation.Scheduler([evaluation.ThreadPoolResource(2)], policy=policy)
+        result = evaluation.run(analysis, scheduler=scheduler,
+                                persistent_cache=True, keep_results=False, workspace=workspace)
+    assert result[0] == n_samples * (n_samples - 1) / 2
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("{:>10} {:>8} {:>20} {:10.2f} {:14.1f}".format(
+        n_samples, variant, type(policy).__name__, time.perf_counter() - start, peak_rss))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        run(int(sys.argv[1]), sys.argv[2], sys.argv[3])
+        sys.exit()
+    print("{:>10} {:>8} {:>20} {:>10} {:>14}".format("n_samples", "variant", "policy", "time [s]", "peak RSS [MB]"))
+    variants = [("list", "CriticalPathPolicy"), ("reduce", "CriticalPathPolicy"), ("reduce", "LIFOPolicy")]
+    for n_samples in [100, 400]:
+        for variant, policy in variants:
+            subprocess.run([sys.executable, __file__, str(n_samples), variant, policy], check=True)
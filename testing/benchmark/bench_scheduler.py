@@ -0,0 +1,90 @@
+"""
+Benchmark of the scheduling overhead per task for DAGs of 10k - 100k tasks.
+The DAG is appended to the Scheduler in batches (like the expansion of composed tasks
+in Evaluation.execute) and the tasks are finished by a fake resource with limited throughput,
+so the action evaluation is not included.
+
+Usage:
+    python bench_scheduler.py
+"""
+import time
+import random
+
+from visip.dev import evaluation, task as task_mod
+from visip.action import constructor
+
+
+class FakeResource(evaluation.Resource):
+    """
+    Accept at most 'n_threads' tasks, finish at most 'throughput' submitted tasks per 'get_finished' call.
+    """
+    def __init__(self, throughput):
+        super().__init__()
+        self.throughput = throughput
+        self.n_threads = 2 * throughput
+        self._submitted = []
+
+    def submit(self, task):
+        self._submitted.append(task)
+
+    def can_accept(self):
+        return len(self._submitted) < self.n_threads
+
+    @property
+    def n_running(self):
+        return len(self._submitted)
+
+    def get_finished(self):
+        finished = self._submitted[:self.throughput]
+        del self._submitted[:self.throughput]
+        for task in finished:
+            task.finish(result=None, task_hash=task.id)
+        return finished
+
+
+def make_dag(n_tasks, batch_size, seed=0):
+    """
+    Generate the random DAG in batches, tasks are created just before they are appended
+    to the scheduler, like in the expansion of composed tasks.
+    """
+    random.seed(seed)
+    action = constructor.A_list()
+    tasks = []
+    for i_batch in range(0, n_tasks, batch_size):
+        batch = []
+        for i in range(i_batch, min(n_tasks, i_batch + batch_size)):
+            n_inputs = min(i, random.randint(0, 3))
+            inputs = random.sample(tasks[max(0, i - 1000):], n_inputs)
+            task = task_mod.Atomic(action, inputs, None, str(i))
+            task.eval_time = random.uniform(0.5, 2.0)
+            tasks.append(task)
+            batch.append(task)
+        yield batch
+
+
+def bench_scheduler(n_tasks, batch_size=1024, throughput=256):
+    batches = make_dag(n_tasks, batch_size)
+    scheduler = evaluation.Scheduler([FakeResource(throughput)], n_tasks_limit=batch_size)
+    elapsed = 0
+    batch = next(batches, None)
+    n_iterations = 0
+    n_finished = 0
+    while batch is not None or scheduler.n_assigned_tasks or scheduler.n_running_tasks:
+        start = time.perf_counter()
+        if scheduler.can_expand() and batch is not None:
+            scheduler.append(batch)
+            batch = None
+        n_finished += len(scheduler.update())
+        scheduler.optimize()
+        elapsed += time.perf_counter() - start
+        n_iterations += 1
+        if batch is None:
+            batch = next(batches, None)
+    assert n_finished == n_tasks
+    print("tasks: {:8d}  iterations: {:6d}  total: {:8.3f} s  per task: {:8.2f} us"
+          .format(n_tasks, n_iterations, elapsed, elapsed / n_tasks * 1e6))
+
+
+if __name__ == "__main__":
+    for n in [10000, 30000, 100000]:
+        bench_scheduler(n)
@@ -0,0 +1,58 @@
+"""
+Micro benchmark of the task representation: memory and creation time per task
+of a ForEach like expansion. Every iteration creates an item task (Atomic),
+a body task (Composed) and its head (ComposedHead).
+
+Usage:
+    python bench_task.py [n_iterations]
+"""
+import sys
+import time
+import tracemalloc
+
+import visip as wf
+from visip.dev import task as task_mod
+from visip.action import constructor
+
+
+@wf.action_def
+def item(items: list, i: int) -> int:
+    return items[i]
+
+
+@wf.workflow
+def body(self, x):
+    return x
+
+
+def expand(n_iterations):
+    parent = task_mod.Atomic(constructor.Pass(), [], None, '__root__')
+    items = task_mod.Atomic(constructor.Pass(), [], parent, 'items')
+    body_action = body.action
+    item_action = item.action
+    tasks = []
+    for i in range(n_iterations):
+        item_task = task_mod.Atomic(item_action, [items], parent, ('item', i))
+        tasks.append(task_mod.Composed(body_action, [item_task], parent, i))
+    return tasks
+
+
+def run(n_iterations):
+    n_tasks = 3 * n_iterations
+    start = time.perf_counter()
+    tasks = expand(n_iterations)
+    create_time = time.perf_counter() - start
+    del tasks
+
+    tracemalloc.start()
+    tasks = expand(n_iterations)
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:>10} {:>14.1f} {:>16.2f}".format(n_tasks, memory / n_tasks, create_time / n_tasks * 1e6))
+
+
+if __name__ == "__main__":
+    print("{:>10} {:>14} {:>16}".format("n_tasks", "bytes/task", "create [us/task]"))
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else [10000, 100000, 1000000]
+    for n_iterations in sizes:
+        run(n_iterations // 3)
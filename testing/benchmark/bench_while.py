@@ -0,0 +1,65 @@
+"""
+Benchmark of the While loop: number of live tasks during a long loop
+with and without release of the finished iterations.
+
+Usage:
+    python bench_while.py [n_iterations]
+"""
+import gc
+import sys
+import time
+
+import visip as wf
+from visip.code import wrap
+from visip.dev import evaluation, meta, task
+
+
+n_iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+
+@wf.action_def
+def condition(i: int, total: int) -> bool:
+    return i < n_iterations
+
+
+@wf.action_def
+def body(i: int, total: int) -> wf.Any:
+    return i + 1, total + i
+
+
+while_collapse = wrap.public_action(meta.While(collapse=True))
+while_keep = wrap.public_action(meta.While(collapse=False))
+
+
+@wf.workflow
+def loop_collapse(self):
+    return while_collapse((0, 0), condition, body)
+
+
+@wf.workflow
+def loop_keep(self):
+    return while_keep((0, 0), condition, body)
+
+
+class Scheduler(evaluation.Scheduler):
+    n_calls = 0
+    max_tasks = 0
+
+    def append(self, tasks):
+        super().append(tasks)
+        self.n_calls += 1
+        if self.n_calls % 500 == 0:
+            gc.collect()
+            n_tasks = sum(1 for o in gc.get_objects() if isinstance(o, task._TaskBase))
+            self.max_tasks = max(self.max_tasks, n_tasks)
+
+
+if __name__ == "__main__":
+    print("{:>10} {:>10} {:>14}".format("collapse", "time [s]", "max live tasks"))
+    for collapse, loop in [(False, loop_keep), (True, loop_collapse)]:
+        scheduler = Scheduler([evaluation.Resource()])
+        start = time.perf_counter()
+        result = evaluation.run(loop, [], scheduler=scheduler)
+        run_time = time.perf_counter() - start
+        assert result == (n_iterations, n_iterations * (n_iterations - 1) // 2)
+        print("{:>10} {:>10.2f} {:>14}".format(str(collapse), run_time, scheduler.max_tasks))
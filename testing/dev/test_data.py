@@ -1,3 +1,8 @@
+import os
+import sys
+import hashlib
+import subprocess
+import numpy as np
 from visip.dev import data
 from typing import *
 import attr
@@ -20,4 +25,103 @@ def test_data():
     hb2 = data.hash(b_inst2)
     assert hb1 == hb2
     b_inst.a = 134
-    assert hb1 != data.hash(b_inst)
\ No newline at end of file
+    assert hb1 != data.hash(b_inst)
+
+def test_hash_stable():
+    # Hash must not depend on the process (PYTHONHASHSEED).
+    code = "from visip.dev import data; print(data.hash(['ahoj', 1, 2.5, None, {1: 'a', 2: (3, 4)}]))"
+    results = set()
+    for seed in ["1", "2"]:
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        out = subprocess.run([sys.executable, "-c", code], env=env, stdout=subprocess.PIPE, check=True)
+        results.add(out.stdout)
+    assert len(results) == 1
+    assert int(results.pop()) == data.hash(['ahoj', 1, 2.5, None, {2: (3, 4), 1: 'a'}])
+
+
+def test_hash_numpy():
+    a = np.arange(24, dtype=float).reshape(4, 6)
+    assert data.hash(a) == data.hash(a.copy())
+    assert data.hash(a) != data.hash(a.reshape(6, 4))
+    assert data.hash(a) != data.hash(a.astype(np.float32))
+    # Non-contiguous view.
+    assert data.hash(a.T) == data.hash(np.ascontiguousarray(a.T))
+    assert data.hash(a.T) != data.hash(a)
+    assert data.hash(1) != data.hash(1.0)
+    assert data.hash(1) != data.hash(True)
+    assert data.hash([1, 2]) != data.hash((1, 2))
+    assert data.hash(1, previous=data.hash(None)) != data.hash(1)
+
+
+def test_size_estimate():
+    assert data.size_estimate(np.zeros(1000)) >= 8000
+    assert data.size_estimate(np.zeros(1000)[::2]) >= 4000
+    assert data.size_estimate([np.zeros(1000)] * 100) >= 8 * 10**5
+    assert data.size_estimate({'a': np.zeros(10), 'b': 1}) > 80
+
+
+def test_hash_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "file.bin")
+    content = bytes(range(256)) * 1000
+    with open(path, "wb") as f:
+        f.write(content)
+    assert data.hash_file_stream(path) == data.hash(hashlib.sha1(content).digest())
+    empty_path = str(tmp_path / "empty.bin")
+    open(empty_path, "wb").close()
+    assert data.hash_file_stream(empty_path) == data.hash(hashlib.sha1(b"").digest())
+
+    index = data.FileHashIndex(str(tmp_path / "index.sqlite"))
+    file_hash = data.hash_file_stream(path)
+    # Too recent file is not indexed.
+    assert index.hash_file(path) == file_hash
+    old_time = os.stat(path).st_mtime_ns - 10**10
+    os.utime(path, ns=(old_time, old_time))
+    assert index.hash_file(path) == file_hash
+    # Unchanged file is not read.
+    monkeypatch.setattr(data, 'hash_file_content', lambda path: 0)
+    assert index.hash_file(path) == file_hash
+    assert data.FileHashIndex(index.db_path).hash_file(path) == file_hash
+    # Hashes of other scheme are not used.
+    monkeypatch.setattr(data, '_TREE_MIN_SIZE', 1024)
+    assert index.hash_file(path) == 0
+    monkeypatch.undo()
+    monkeypatch.setattr(data, 'hash_file_content', lambda path: 0)
+    assert index.hash_file(path) == file_hash
+    # Modified file is hashed again.
+    with open(path, "ab") as f:
+        f.write(b"x")
+    assert index.hash_file(path) == 0
+
+    # The default index is opt-in.
+    monkeypatch.delenv('VISIP_FILE_HASH_INDEX', raising=False)
+    monkeypatch.setattr(data, '_file_hash_index', None)
+    assert data.file_hash_index() is None
+    monkeypatch.setenv('VISIP_FILE_HASH_INDEX', str(tmp_path / "default.sqlite"))
+    monkeypatch.setattr(data, '_file_hash_index', None)
+    assert data.file_hash_index().db_path == str(tmp_path / "default.sqlite")
+
+
+def test_hash_file_tree(tmp_path):
+    path = str(tmp_path / "file.bin")
+    content = bytearray(os.urandom(10000))
+    with open(path, "wb") as f:
+        f.write(content)
+    digests = data.file_chunk_digests(path, chunk_size=1024, n_threads=4)
+    assert len(digests) == 10
+    assert digests[3] == hashlib.sha1(b'\x00' + content[3072:4096]).digest()
+    tree_hash = data.hash_file_tree(path, chunk_size=1024)
+    assert tree_hash == data.merkle_root(digests, chunk_size=1024)
+    assert tree_hash != data.hash_file_tree(path, chunk_size=2048)
+    assert data.hash_file_tree(path, chunk_size=1024, n_threads=1) == tree_hash
+    # Single pool shared by the calls.
+    assert data._hash_executor() is data._hash_executor()
+    # Small files are hashed by the stream.
+    assert data.hash_file_content(path) == data.hash_file_stream(path)
+
+    # Changed regions.
+    content[5000] ^= 1
+    with open(path, "wb") as f:
+        f.write(content + b"tail")
+    new_digests = data.file_chunk_digests(path, chunk_size=1024)
+    assert data.changed_chunks(digests, new_digests) == [4, 9]
+    assert data.hash_file_tree(path, chunk_size=1024) != tree_hash
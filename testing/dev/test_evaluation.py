@@ -1,8 +1,15 @@
 import pytest
 import os
+import time
+import pickle
+import asyncio
+import threading
+from typing import Any
 
 from visip.dev import evaluation, task, module
 from visip.code import decorators
+from visip.action import constructor, std
+from visip.eval import cache
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
 
@@ -71,3 +78,346 @@ def test_action_skipping():
     result = evaluation.run(make_calls)
     assert len(result) == 3
     assert global_n_calls == 2
+
+
+@decorators.workflow
+def double_wf(self, a):
+    self.b = count_calls(a)
+    return self.b
+
+
+@decorators.analysis
+def make_fan_out(self):
+    return [double_wf(i) for i in range(20)]
+
+
+@pytest.mark.parametrize("memory_limit", [None, 1, 10**9])
+def test_memory_limit(memory_limit):
+    # Calls of the same workflow with different inputs.
+    eval = evaluation.Evaluation(memory_limit=memory_limit)
+    final_task = eval.execute(make_fan_out.action)
+    assert final_task.result == [2 * i for i in range(20)]
+    double_tasks = [t for t in final_task.childs.values() if t.action.name == 'double_wf']
+    assert len(double_tasks) == 20
+    for t in double_tasks:
+        if memory_limit is None:
+            assert t.child('b').result == t.result
+        else:
+            # Bodies of finished composed tasks are released.
+            assert t.childs == {}
+    if memory_limit is not None:
+        # Results kept by the result cache are bounded as well.
+        result_cache = eval.scheduler.resources[0].cache
+        assert isinstance(result_cache, cache.BoundedResultCache)
+        assert result_cache.n_bytes <= memory_limit
+
+
+@pytest.mark.parametrize("memory_limit", [None, 10**9])
+def test_release_results(memory_limit):
+    eval = evaluation.Evaluation(keep_results=False, memory_limit=memory_limit)
+    final_task = eval.execute(make_fan_out.action)
+    assert final_task.result == [2 * i for i in range(20)]
+    double_tasks = [t for t in final_task.childs.values() if t.action.name == 'double_wf']
+    assert len(double_tasks) == 20
+    for i, t in enumerate(double_tasks):
+        assert t.is_released()
+        assert t.is_finished()
+        # Released result is still in the result cache.
+        assert eval.task_result(t) == 2 * i
+        if memory_limit is None:
+            assert t.child('b').is_released()
+
+
+def test_result_cache_bytes():
+    eval = evaluation.Evaluation(keep_results=False, result_cache_bytes=10**6, cache_policy='cost')
+    final_task = eval.execute(make_fan_out.action)
+    assert final_task.result == [2 * i for i in range(20)]
+    result_cache = eval.scheduler.resources[0].cache
+    assert isinstance(result_cache, cache.BoundedResultCache)
+    assert result_cache.policy == 'cost'
+    assert 0 < result_cache.n_bytes <= 10**6
+    double_tasks = [t for t in final_task.childs.values() if t.action.name == 'double_wf']
+    assert [eval.task_result(t) for t in double_tasks] == [2 * i for i in range(20)]
+
+
+@decorators.action_def
+def sleep_double(a: int) -> Any:
+    start = time.time()
+    time.sleep(0.2)
+    return 2 * a, start, time.time()
+
+
+@decorators.analysis
+def make_sleeps(self):
+    return [sleep_double(i) for i in range(8)]
+
+
+def overlap(intervals):
+    # True if some of the time intervals overlap.
+    intervals = sorted(intervals)
+    return any(next_start < end for (start, end), (next_start, next_end) in zip(intervals, intervals[1:]))
+
+
+@pytest.mark.parametrize("resource_class", [evaluation.ThreadPoolResource, evaluation.ProcessPoolResource])
+def test_pool_resource(resource_class):
+    with resource_class(n_threads=8) as resource:
+        scheduler = evaluation.Scheduler([resource])
+        result = evaluation.run(make_sleeps, scheduler=scheduler)
+    assert [r[0] for r in result] == [2 * i for i in range(8)]
+    # Evaluated concurrently.
+    assert overlap([r[1:] for r in result])
+
+
+def test_pickle_action():
+    action = sleep_double.action
+    assert action._evaluate.__qualname__ == 'sleep_double'
+    assert pickle.loads(pickle.dumps(action)) is action
+
+
+@pytest.mark.parametrize("persistent_cache, result_cache_bytes", [(True, None), ('sqlite', None), ('sqlite', 10**6)])
+def test_persistent_cache(tmp_path, persistent_cache, result_cache_bytes):
+    global global_n_calls
+    global_n_calls = 0
+    workspace = str(tmp_path)
+    kwargs = dict(workspace=workspace, persistent_cache=persistent_cache, result_cache_bytes=result_cache_bytes)
+    result = evaluation.run(make_calls, **kwargs)
+    assert result == [0, 2, 0]
+    assert global_n_calls == 2
+    # Results are written at the end of the evaluation.
+    result = evaluation.run(make_calls, **kwargs)
+    assert result == [0, 2, 0]
+    assert global_n_calls == 2
+
+
+def test_persistent_cache_relative_workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = evaluation.run(make_calls, workspace="ws", persistent_cache=True)
+    assert result == [0, 2, 0]
+    assert os.path.isfile(str(tmp_path / "ws" / cache.FileResultCache.default_dir / "index"))
+
+
+def test_persistent_cache_sqlite_thread(tmp_path, monkeypatch):
+    # The evaluation is created and executed by different threads, as in the GUI.
+    global global_n_calls
+    global_n_calls = 0
+    monkeypatch.chdir(tmp_path)
+    for i in range(2):
+        eval_obj = evaluation.Evaluation(workspace="ws", persistent_cache='sqlite')
+        analysis = evaluation.Evaluation.make_analysis(make_calls.action, [])
+        results = []
+        thread = threading.Thread(target=lambda: results.append(eval_obj.execute(analysis).result))
+        thread.start()
+        thread.join()
+        assert results == [[0, 2, 0]]
+        assert global_n_calls == 2
+    assert os.path.isfile(str(tmp_path / "ws" / cache.SQLiteResultCache.default_file))
+
+
+read_calls = []
+
+@decorators.action_def
+def read_text(input: std.FileIn) -> str:
+    read_calls.append(input.path)
+    with open(input.path) as f:
+        return f.read()
+
+
+@decorators.workflow
+def read_input(self):
+    return read_text(std.file_in('in.txt'))
+
+
+def test_persistent_cache_file_in(tmp_path):
+    workspace = str(tmp_path)
+    read_calls.clear()
+
+    def run(content):
+        if content is not None:
+            with open(os.path.join(workspace, 'in.txt'), 'w') as f:
+                f.write(content)
+        return evaluation.run(read_input, workspace=workspace, persistent_cache=True)
+
+    assert run("first") == "first"
+    # Changed input file is not taken from the cache.
+    assert run("second") == "second"
+    assert len(read_calls) == 2
+    # Unchanged file, the consumer hits the cache.
+    assert run(None) == "second"
+    assert len(read_calls) == 2
+
+
+def test_scheduler_optimize():
+    def make_task(name, inputs):
+        return task.Atomic(constructor.A_list(), inputs, None, name)
+
+    scheduler = evaluation.Scheduler([evaluation.Resource()])
+    a = make_task('a', [])
+    b = make_task('b', [a])
+    c = make_task('c', [b])
+    d = make_task('d', [a])
+    for t in [a, b, c, d]:
+        t.eval_time = 1
+    scheduler.append([a, b, c, d])
+    scheduler.optimize()
+    assert [t.start_time for t in [a, b, c, d]] == [0, 1, 2, 1]
+    assert [t.critical_path for t in [a, b, c, d]] == [3, 2, 1, 1]
+    assert [item[-1] for item in scheduler._ready_queue] == [a]
+
+    # Only the new task is processed, change is propagated to predecessors.
+    e = make_task('e', [c, d])
+    e.eval_time = 1
+    scheduler.append([e])
+    scheduler.optimize()
+    assert e.start_time == 3
+    assert [t.critical_path for t in [a, b, c, d, e]] == [4, 3, 2, 2, 1]
+
+
+class RecordingResource(evaluation.Resource):
+    def __init__(self):
+        super().__init__()
+        self.submitted = []
+
+    def submit(self, task):
+        self.submitted.append(task.child_id)
+        super().submit(task)
+
+
+@pytest.mark.parametrize("policy, order", [
+    (evaluation.FIFOPolicy(), ['a', 'b', 'c']),
+    (evaluation.CriticalPathPolicy(), ['b', 'c', 'a']),
+    (evaluation.LPTPolicy(), ['c', 'b', 'a']),
+    (evaluation.LIFOPolicy(), ['c', 'b', 'a']),
+    (evaluation.UserPriorityPolicy(lambda t: t.child_id == 'a'), ['a', 'b', 'c'])])
+def test_scheduling_policy(policy, order):
+    resource = RecordingResource()
+    scheduler = evaluation.Scheduler([resource], policy=policy)
+    a = task.Atomic(constructor.A_list(), [], None, 'a')
+    b = task.Atomic(constructor.A_list(), [], None, 'b')
+    c = task.Atomic(constructor.A_list(), [], None, 'c')
+    b_post = task.Atomic(constructor.A_list(), [b], None, 'b_post')
+    for t, eval_time in [(a, 1), (b, 2), (c, 3), (b_post, 2)]:
+        t.eval_time = eval_time
+    scheduler.append([a, b, c, b_post])
+    scheduler.optimize()
+    scheduler.update()
+    assert resource.submitted[:3] == order
+
+
+@pytest.mark.parametrize("keep_results, memory_limit", [(True, None), (False, 10**9)])
+def test_fuse_tasks(keep_results, memory_limit):
+    final_tasks = []
+    for fuse_tasks in [False, True]:
+        resource = RecordingResource()
+        eval = evaluation.Evaluation(scheduler=evaluation.Scheduler([resource]), fuse_tasks=fuse_tasks,
+                                     keep_results=keep_results, memory_limit=memory_limit)
+        final_task = eval.execute(make_fan_out.action)
+        assert final_task.result == [2 * i for i in range(20)]
+        final_tasks.append((final_task, resource.submitted))
+    (plain_task, plain_submitted), (fused_task, fused_submitted) = final_tasks
+    # Same hashes, just the cheap tasks (heads, constants, lists, results) are not submitted.
+    assert fused_task.result_hash == plain_task.result_hash
+    assert len(plain_submitted) == 103
+    assert len(fused_submitted) == 41
+    assert {str(t)[:6] for t in fused_submitted} == {'__root', 'b', 'double'}
+
+
+@decorators.action_def
+def long_sleep(a: int) -> int:
+    time.sleep(1.0)
+    return a
+
+
+@decorators.analysis
+def make_long_sleep(self):
+    return long_sleep(1)
+
+
+class CountingScheduler(evaluation.Scheduler):
+    """
+    Counts the notifications, the waits for a finished task and the waits ended by the timeout.
+    """
+    n_notified = 0
+    n_waits = 0
+    n_timeouts = 0
+
+    def notify_finished(self):
+        self.n_notified += 1
+        super().notify_finished()
+
+    def wait(self, timeout: float = None):
+        self.n_waits += 1
+        if not self._finished_event.wait(self.max_wait if timeout is None else timeout):
+            self.n_timeouts += 1
+        super().wait(0)
+
+
+def test_event_driven_loop():
+    # Scheduler waits for the running task instead of busy polling.
+    with evaluation.ThreadPoolResource(n_threads=2) as resource:
+        scheduler = CountingScheduler([resource])
+        scheduler.max_wait = 60
+        result = evaluation.run(make_long_sleep, scheduler=scheduler)
+    assert result == 1
+    # Woken up by the finished tasks only.
+    assert scheduler.n_timeouts == 0
+    assert 1 <= scheduler.n_waits <= scheduler.n_notified
+
+
+n_in_flight = 0
+max_in_flight = 0
+
+
+@decorators.action_def
+async def async_double(a: int) -> int:
+    global n_in_flight, max_in_flight
+    n_in_flight += 1
+    max_in_flight = max(max_in_flight, n_in_flight)
+    await asyncio.sleep(0.1)
+    n_in_flight -= 1
+    return 2 * a
+
+
+@decorators.analysis
+def make_async_calls(self):
+    return [async_double(i) for i in range(500)]
+
+
+@decorators.action_def
+async def count_ticks(duration: float) -> int:
+    # Number of loop iterations during the 'duration'.
+    n_ticks = 0
+    end = time.time() + duration
+    while time.time() < end:
+        await asyncio.sleep(0.01)
+        n_ticks += 1
+    return n_ticks
+
+
+@decorators.analysis
+def make_mixed_calls(self):
+    return [count_ticks(0.5), make_sleeps()]
+
+
+def test_run_async():
+    global max_in_flight
+    max_in_flight = 0
+    loop = asyncio.new_event_loop()
+    try:
+        n_threads = threading.active_count()
+        result = loop.run_until_complete(evaluation.run_async(make_async_calls))
+        assert threading.active_count() == n_threads
+        with evaluation.AsyncioResource(n_threads=8) as resource:
+            scheduler = evaluation.Scheduler([resource])
+            n_ticks, sleeps = loop.run_until_complete(evaluation.run_async(make_mixed_calls, scheduler=scheduler))
+    finally:
+        loop.close()
+    assert result == [2 * i for i in range(500)]
+    # All coroutines in flight at once.
+    assert max_in_flight == 500
+    # Synchronous actions run concurrently in the threads, the loop is not blocked by them.
+    assert [r[0] for r in sleeps] == [2 * i for i in range(8)]
+    assert overlap([r[1:] for r in sleeps])
+    assert n_ticks > 10
+
+    # Async actions in synchronous evaluation.
+    assert evaluation.run(async_double, [3]) == 6
@@ -1,6 +1,9 @@
+import pytest
 import os
+import time
 import visip as wf
-from visip.dev import evaluation
+from visip.dev import evaluation, meta, exceptions, task as task_mod
+from visip.code import wrap
 # script_dir = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -29,20 +32,39 @@ def test_action_returning_action():
 
 #######################
 
-# @wf.action_def
-# def add(a: float, b: float) -> float:
-#     return a + b
-#
-# @wf.analysis
-# def tst_partial_adder() -> float:
-#     adder_val = wf.partial(add, 7)
-#     return adder_val(2)
-#
-#
-# def test_partial():
-#     result = evaluation.run(tst_partial_adder)
-#     assert result == 9
-#
+@wf.action_def
+def add(a: float, b: float) -> float:
+    return a + b
+
+@wf.analysis
+def tst_partial_adder() -> float:
+    adder_val = wf.partial(add, 7)
+    return adder_val(2)
+
+
+@wf.workflow
+def shift(self, a, b, x):
+    return add(x, add(a, b))
+
+@wf.workflow
+def map_shift(self, a, items):
+    return wf.foreach(wf.partial(shift, a, 1), items)
+
+
+def test_partial():
+    result = evaluation.run(tst_partial_adder)
+    assert result == 9
+
+    # Closure of a workflow, all the calls share the single closure action.
+    items = [1, 2, 3]
+    assert evaluation.run(map_shift, [10, items]) == [12, 13, 14]
+
+    # Parameters and hash of the closure.
+    closure = meta._PartialClosure(add.action, [7], [11])
+    assert [param.name for param in closure.parameters] == ['b']
+    assert closure.evaluate([2]) == 9
+    assert closure.action_hash() != meta._PartialClosure(add.action, [7], [12]).action_hash()
+
 #############################
 
 @wf.workflow
@@ -64,21 +86,340 @@ def test_if_action():
     result = evaluation.run(wf_condition, [False])
     assert result == 100
 
-# @wf.action_def
-# def condition(lst:wf.List[float], num:float, end:float) -> bool:
-#     return num < end
-#
-# @wf.action_def
-# def body(lst:wf.List[float], num:float, inc:float) -> wf.List[float]:
-#     lst.append(num)
-#     return lst, num + inc
-#
-# @wf.workflow
-# def linspace(self, begin: float, end:float, inc:int):
-#     cond = wf.partial(condition, end=end)
-#     b = wf.partial(body, inc=inc)
-#     return wf.While(([], begin), cond, b)
-#
-# def test_while():
-#     result = evaluation.run(linspace, 1.1, 3.4, 0.6)
-#     assert result == ([1.1, 1.7, 2.3, 2.9], 3.5)
+
+branch_calls = []
+
+@wf.action_def
+def make_branch(value: int) -> wf.Any:
+    branch_calls.append(value)
+    def branch() -> int:
+        return value
+    return wf.action_def(branch)
+
+@wf.action_def
+def is_positive(x: int) -> bool:
+    return x > 0
+
+@wf.workflow
+def wf_lazy_condition(self, x: int) -> int:
+    return wf.If(is_positive(x), make_branch(1), make_branch(-1))
+
+@wf.workflow
+def wf_branch(self, value: int):
+    return make_branch(value)
+
+@wf.workflow
+def wf_lazy_workflow(self, x: int) -> int:
+    return wf.If(is_positive(x), wf_branch(1), wf_branch(-1))
+
+def test_if_short_circuit():
+    # Only the taken branch is evaluated (or expanded).
+    for analysis in [wf_lazy_condition, wf_lazy_workflow]:
+        for x, value in [(5, 1), (-5, -1)]:
+            branch_calls.clear()
+            result = evaluation.run(analysis, [x])
+            assert result == value
+            assert branch_calls == [value]
+
+events = []
+
+@wf.action_def
+def slow_condition(x: int) -> bool:
+    time.sleep(0.2)
+    events.append('condition')
+    return x > 0
+
+@wf.action_def
+def record_branch(value: int) -> int:
+    events.append(value)
+    return value
+
+@wf.workflow
+def branch_plus(self):
+    return record_branch(1)
+
+@wf.workflow
+def branch_minus(self):
+    return record_branch(-1)
+
+likely_if = wrap.public_action(meta._If(likely=True))
+
+@wf.workflow
+def wf_likely(self, x: int) -> int:
+    return likely_if(slow_condition(x), branch_plus, branch_minus)
+
+@wf.workflow
+def wf_unlikely(self, x: int) -> int:
+    return wf.If(slow_condition(x), branch_plus, branch_minus)
+
+class RecordingPool(evaluation.ThreadPoolResource):
+    def __init__(self, n_threads):
+        super().__init__(n_threads)
+        self.submitted = []
+
+    def submit(self, task):
+        self.submitted.append(task.child_id)
+        super().submit(task)
+
+def test_if_speculative(tmp_path):
+    def run(analysis, x, resource=None, speculative=True, **kwargs):
+        events.clear()
+        scheduler = evaluation.Scheduler([resource or evaluation.ThreadPoolResource(2)])
+        return evaluation.run(analysis, [x], scheduler=scheduler, speculative=speculative, **kwargs)
+
+    assert run(wf_likely, 5, speculative=False) == 1
+    assert events == ['condition', 1]
+    # The likely branch runs together with the condition.
+    assert run(wf_likely, 5) == 1
+    assert events == [1, 'condition']
+    # Wrong guess.
+    assert run(wf_likely, -5) == -1
+    assert events == [1, 'condition', -1]
+
+    # Guess given by the previous outcome.
+    resource = RecordingPool(2)
+    assert run(wf_unlikely, -5, resource) == -1
+    assert events == ['condition', -1]
+    assert ('speculative', False) not in resource.submitted
+    assert run(wf_unlikely, -6, resource) == -1
+    assert ('speculative', False) in resource.submitted
+
+    # Outcomes kept in the workspace are used by a new resource.
+    workspace = str(tmp_path)
+    resource = RecordingPool(2)
+    assert run(wf_unlikely, -5, resource, workspace=workspace, persistent_cache=True) == -1
+    assert ('speculative', False) not in resource.submitted
+    resource = RecordingPool(2)
+    assert run(wf_unlikely, -7, resource, workspace=workspace, persistent_cache=True) == -1
+    assert ('speculative', False) in resource.submitted
+
+    # Synchronous resource never speculates.
+    assert run(wf_likely, -5, evaluation.Resource()) == -1
+    assert events == ['condition', -1]
+
+
+while_calls = []
+
+@wf.action_def
+def condition(num: float, total: float) -> bool:
+    return num < 4
+
+@wf.action_def
+def condition_long(num: float, total: float) -> bool:
+    return num < 200
+
+@wf.action_def
+def body(num: float, total: float) -> wf.Any:
+    while_calls.append(num)
+    return num + 1, total + num
+
+@wf.workflow
+def sum_range(self, begin: float):
+    return wf.While((begin, 0), condition, body)
+
+@wf.workflow
+def sum_range_long(self, begin: float):
+    return wf.While((begin, 0), condition_long, body)
+
+@wf.action_def
+def lt10(a: int) -> bool:
+    return a < 10
+
+@wf.action_def
+def add3(a: int) -> int:
+    return a + 3
+
+@wf.workflow
+def scalar_while(self, x):
+    return wf.While(x, lt10, add3)
+
+
+def n_tree_tasks(task):
+    # Number of tasks in the task tree of the composed 'task'.
+    childs = task.childs.values() if isinstance(task, task_mod.Composed) and task.childs else []
+    return 1 + sum(n_tree_tasks(child) for child in childs)
+
+
+def test_while():
+    resource = evaluation.Resource()
+    scheduler = evaluation.Scheduler([resource])
+    result = evaluation.run(sum_range, [1], scheduler=scheduler)
+    assert result == (4, 6)
+    assert while_calls == [1, 2, 3]
+    assert evaluation.run(sum_range, [5]) == (5, 0)
+
+    # Longer loop resumes after the cached iterations.
+    while_calls.clear()
+    result = evaluation.run(sum_range_long, [1], scheduler=evaluation.Scheduler([resource]))
+    assert result == (200, sum(range(200)))
+    assert while_calls == list(range(4, 200))
+
+    # Scalar state.
+    assert evaluation.run(scalar_while, [1]) == 10
+    assert evaluation.run(scalar_while, [20]) == 20
+
+    # Tasks of the finished iterations are released.
+    eval = evaluation.Evaluation()
+    final_task = eval.execute(evaluation.Evaluation.make_analysis(sum_range_long.action, [1]))
+    assert final_task.result == (200, sum(range(200)))
+    assert n_tree_tasks(final_task) < 30
+
+
+#############################
+
+@wf.action_def(vectorized=True)
+def quadrature(a: float, b: float) -> float:
+    # Works for scalar and stacked inputs.
+    return a * a + b
+
+
+@wf.action_def
+def square(a: float) -> float:
+    return a * a
+
+
+@wf.workflow
+def sweep(self, a_list, b_list):
+    self.q = wf.batch_map(quadrature, 3, a_list, b_list)
+    self.s = wf.batch_map(square, 4, a_list)
+    return wf.tuple(self.q, self.s)
+
+
+@wf.action_def(vectorized=True)
+def both(a: int, b: int) -> wf.Any:
+    return a + b, a * b
+
+
+@wf.action_def(vectorized=True)
+def first_only(a: float) -> float:
+    return a[:1]
+
+
+@wf.workflow
+def square_wf(self, a):
+    return square(a)
+
+
+@wf.workflow
+def sum_prod(self, a_list, b_list):
+    return wf.batch_map(both, 2, a_list, b_list)
+
+
+@wf.workflow
+def wrong_size(self, a_list):
+    return wf.batch_map(first_only, 2, a_list)
+
+
+@wf.workflow
+def map_workflow(self, a_list):
+    return wf.batch_map(square_wf, 2, a_list)
+
+
+def test_batch_map():
+    a_list = [float(i) for i in range(10)]
+    b_list = [1.0] * 10
+    q, s = evaluation.run(sweep, [a_list, b_list])
+    assert q == [a * a + 1.0 for a in a_list]
+    assert s == [a * a for a in a_list]
+    # Python values as from the per-item calls.
+    assert all(type(x) is float for x in q)
+    q, s = evaluation.run(sweep, [[], []])
+    assert q == [] and s == []
+
+    @wf.workflow
+    def zero_chunks(self, a_list):
+        return wf.batch_map(square, 0, a_list)
+    with pytest.raises(exceptions.ExcInvalidCall):
+        evaluation.run(zero_chunks, [a_list])
+
+    # Several outputs.
+    assert evaluation.run(sum_prod, [[1, 2, 3], [4, 5, 6]]) == [(5, 4), (7, 10), (9, 18)]
+    with pytest.raises(exceptions.ExcInvalidCall):
+        evaluation.run(wrong_size, [[1.0, 2.0, 3.0]])
+    # Composed function.
+    with pytest.raises(exceptions.ExcInvalidCall):
+        evaluation.run(map_workflow, [a_list])
+
+
+#############################
+
+body_calls = []
+
+@wf.action_def
+def record(a: int) -> int:
+    body_calls.append(a)
+    return 2 * a
+
+
+@wf.workflow
+def double(self, a):
+    return record(a)
+
+
+foreach_3 = wrap.public_action(meta._ForEach(chunk_size=3))
+
+@wf.workflow
+def map_double(self, items):
+    return foreach_3(double, items)
+
+
+def test_foreach():
+    resource = evaluation.Resource()
+    items = list(range(10))
+    result = evaluation.run(map_double, [items], scheduler=evaluation.Scheduler([resource]))
+    assert result == [2 * i for i in items]
+    assert sorted(body_calls) == items
+    assert evaluation.run(map_double, [[]]) == []
+
+    # Chunk results are concatenated once.
+    eval = evaluation.Evaluation()
+    final_task = eval.execute(evaluation.Evaluation.make_analysis(map_double.action, [items]))
+    assert final_task.result == [2 * i for i in items]
+    map_task, = [t for t in final_task.childs.values() if t.action.name == 'map_double']
+    foreach_task, = [t for t in map_task.childs.values() if t.action.name == 'foreach']
+    chunks = [t for t in foreach_task.childs.values() if t.action.name == 'foreach']
+    assert [len(t.result) for t in chunks] == [3, 3, 3, 1]
+    assert isinstance(foreach_task.child('__result__').action, meta._Concat)
+    assert foreach_task.child('__result__').inputs == tuple(chunks)
+
+    # Only the changed item is evaluated again.
+    body_calls.clear()
+    items[4] = 100
+    result = evaluation.run(map_double, [items], scheduler=evaluation.Scheduler([resource]))
+    assert result == [2 * i for i in items]
+    assert body_calls == [100]
+
+    # Public action, single chunk.
+    @wf.workflow
+    def map_public(self, items):
+        return wf.foreach(double, items)
+    assert evaluation.run(map_public, [items]) == [2 * i for i in items]
+
+
+#############################
+
+@wf.action_def(associative=True)
+def concat(a: str, b: str) -> str:
+    return a + b
+
+@wf.action_def
+def subtract(a: float, b: float) -> float:
+    return a - b
+
+@wf.action_def
+def letter(i: int) -> str:
+    return "abcdefg"[i]
+
+@wf.workflow
+def reduce_letters(self):
+    return wf.reduce(concat, [letter(0), letter(1), letter(2), letter(3), letter(4)])
+
+@wf.workflow
+def reduce_list(self, function, items):
+    return wf.reduce(function, items)
+
+def test_reduce():
+    assert evaluation.run(reduce_letters) == "abcde"
+    assert evaluation.run(reduce_list, [concat, list("abcdefg")]) == "abcdefg"
+    assert evaluation.run(reduce_list, [concat, ["a"]]) == "a"
+    assert evaluation.run(reduce_list, [subtract, [10, 1, 2, 3]]) == 4
@@ -0,0 +1,64 @@
+import pytest
+import visip as wf
+from visip.dev import evaluation, exceptions, action_workflow
+from visip.dev import action_instance as instance
+from visip.action import constructor
+
+
+@wf.action_def
+def add(a: float, b: float) -> float:
+    return a + b
+
+
+@wf.action_def
+def mult(a: float, b: float) -> float:
+    return a * b
+
+
+@wf.workflow
+def axpy(self, a, x, y):
+    return add(mult(a, x), y)
+
+
+@wf.workflow
+def poly(self, x):
+    # Nested workflow, constant arguments.
+    self.y = axpy(2, x, 1)
+    return wf.list(axpy(x, self.y, 3), self.y)
+
+
+def test_compile():
+    plan = wf.compile(poly)
+    assert plan.n_inputs == 1
+    assert plan.n_steps == 5
+    for x in [0, 1, 2.5]:
+        assert plan.run([x]) == evaluation.run(poly, [x])
+
+
+@wf.action_def
+def make_adder(a: float) -> wf.Any:
+    def adder(b: float) -> float:
+        return a + b
+    return wf.action_def(adder)
+
+
+@wf.workflow
+def dynamic(self, a, b):
+    return make_adder(a)(b)
+
+
+def test_compile_not_static():
+    with pytest.raises(exceptions.ExcNotStaticWorkflow):
+        wf.compile(dynamic)
+
+
+def test_recompile():
+    w = action_workflow._Workflow("tst_wf")
+    w.insert_slot(0, action_workflow._SlotCall("a_slot"))
+    list_1 = instance.ActionCall.create(constructor.A_list())
+    w.set_action_input(list_1, 0, w.slots[0])
+    w.set_action_input(w.result, 0, list_1)
+    plan = wf.compile(w)
+    assert plan.run([1]) == [1]
+    w.set_action_input(list_1, 1, w.slots[0])
+    assert plan.run([1]) == [1, 1]
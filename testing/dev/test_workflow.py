@@ -73,3 +73,22 @@ def test_workflow_modification():
     res = w.set_action_input(list_2, 0, list_1)     # Cycle
     assert not res
     assert len(list_2.arguments) == 0
+
+
+def test_expansion_plan():
+    from visip.dev import evaluation
+    w = wf._Workflow("tst_wf")
+    w.insert_slot(0, wf._SlotCall("a_slot"))
+    list_1 = instance.ActionCall.create(constructor.A_list())
+    assert w.set_action_input(list_1, 0, w.slots[0])
+    assert w.set_action_input(w.result, 0, list_1)
+    assert evaluation.run(w, [1]) == [1]
+    version = w.version
+
+    # Edits invalidate the cached plan.
+    assert w.set_action_input(list_1, 1, w.slots[0])
+    assert w.version > version
+    assert evaluation.run(w, [1]) == [1, 1]
+    w.insert_slot(0, wf._SlotCall("b_slot"))
+    assert w.set_action_input(list_1, 2, w.slots[0])
+    assert evaluation.run(w, [2, 1]) == [1, 1, 2]
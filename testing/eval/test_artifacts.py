@@ -0,0 +1,67 @@
+import os
+
+import visip as wf
+from visip.dev import evaluation
+from visip.eval import artifacts
+
+
+def test_artifact_store(tmp_path):
+    store = artifacts.ArtifactStore(str(tmp_path / "store"))
+    path = str(tmp_path / "data" / "mesh.msh")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write("mesh")
+    file_in = wf.FileIn(path=path, hash=1234)
+    value = [(file_in, 1), {'a': file_in}]
+    assert list(store.file_ins(value)) == [file_in, file_in]
+    store.store(value)
+    assert store.n_stored == 1
+    assert os.path.isfile(store.object_path(1234))
+
+    # Deleted file is restored.
+    os.remove(path)
+    assert store.restore(value)
+    with open(path) as f:
+        assert f.read() == "mesh"
+    assert store.restore(value)
+    assert store.n_restored == 1
+
+    # Changed file is kept, the value is not valid.
+    os.remove(path)
+    with open(path, "w") as f:
+        f.write("other mesh")
+    assert not store.restore(value)
+    with open(path) as f:
+        assert f.read() == "other mesh"
+
+    # Not stored file.
+    assert not store.restore(wf.FileIn(path=str(tmp_path / "none"), hash=5))
+
+
+n_mesh_calls = 0
+
+@wf.action_def
+def make_mesh(step: float) -> str:
+    global n_mesh_calls
+    n_mesh_calls += 1
+    path = "mesh_{}.msh".format(step)
+    with open(path, "w") as f:
+        f.write("step: {}".format(step))
+    return path
+
+
+@wf.workflow
+def mesh_wf(self, step):
+    return wf.file_in(make_mesh(step))
+
+
+def test_restore_cached_files(tmp_path):
+    workspace = str(tmp_path)
+    result = evaluation.run(mesh_wf, [0.5], workspace=workspace, persistent_cache=True, artifacts=True)
+    assert n_mesh_calls == 1
+    os.remove(result.path)
+    # Cache hit, the file is restored.
+    result = evaluation.run(mesh_wf, [0.5], workspace=workspace, persistent_cache=True, artifacts=True)
+    assert n_mesh_calls == 1
+    with open(result.path) as f:
+        assert f.read() == "step: 0.5"
@@ -0,0 +1,122 @@
+import time
+import numpy as np
+
+from visip.eval import cache
+
+
+def test_file_result_cache(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    values = {123: [1, 2, 3], -456: "ahoj", 1 << 100: np.arange(10)}
+    with cache.FileResultCache(cache_dir) as file_cache:
+        for h, val in values.items():
+            file_cache.insert(h, val)
+        assert file_cache.value(123) == [1, 2, 3]
+        # Values that can not be pickled are kept in the memory.
+        file_cache.insert(789, lambda x: x)
+        assert callable(file_cache.value(789))
+
+    with cache.FileResultCache(cache_dir) as file_cache:
+        assert len(file_cache) == 3
+        assert file_cache.value(123) == [1, 2, 3]
+        assert file_cache.value(-456) == "ahoj"
+        assert np.all(file_cache.value(1 << 100) == np.arange(10))
+        assert file_cache.value(789) is cache.ResultCache.NoValue
+        assert file_cache.value(1) is cache.ResultCache.NoValue
+
+
+def test_file_result_cache_shared(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    # Two evaluations sharing the workspace, appends are interleaved.
+    first, second = cache.FileResultCache(cache_dir), cache.FileResultCache(cache_dir)
+    for i in range(10):
+        first.insert(2 * i, [i] * (i + 1))
+        second.insert(2 * i + 1, "value {}".format(i))
+    first.close()
+    second.close()
+    # Closed cache is still readable, files are opened again.
+    assert first.value(4) == [2, 2, 2]
+    first.insert(100, "new")
+    first.close()
+    first.close()
+
+    with cache.FileResultCache(cache_dir) as file_cache:
+        assert len(file_cache) == 21
+        for i in range(10):
+            assert file_cache.value(2 * i) == [i] * (i + 1)
+            assert file_cache.value(2 * i + 1) == "value {}".format(i)
+
+
+def test_bounded_result_cache():
+    array = np.zeros(1000)
+    size = array.nbytes
+
+    lru_cache = cache.BoundedResultCache(3 * size + 500)
+    for h in range(3):
+        lru_cache.insert(h, np.zeros(1000))
+    assert lru_cache.value(0) is not cache.ResultCache.NoValue
+    lru_cache.insert(3, np.zeros(1000))
+    # The least recently used is evicted.
+    assert lru_cache.value(1) is cache.ResultCache.NoValue
+    assert len(lru_cache) == 3
+    assert lru_cache.n_bytes <= lru_cache.max_bytes
+    assert (lru_cache.n_hits, lru_cache.n_misses, lru_cache.n_evictions) == (1, 1, 1)
+    # Too large value is not stored at all.
+    lru_cache.insert(4, np.zeros(10000))
+    assert lru_cache.value(4) is cache.ResultCache.NoValue
+    assert len(lru_cache) == 3
+
+    cost_cache = cache.BoundedResultCache(3 * size + 500, policy='cost')
+    for h, cost in [(0, 10.0), (1, 0.1), (2, 1.0)]:
+        cost_cache.insert(h, np.zeros(1000), cost=cost)
+    cost_cache.value(1)
+    cost_cache.insert(3, np.zeros(1000), cost=5.0)
+    # The cheapest is evicted, even if recently used.
+    assert cost_cache.value(1) is cache.ResultCache.NoValue
+    assert all(cost_cache.value(h) is not cache.ResultCache.NoValue for h in [0, 2, 3])
+    assert cost_cache.n_evictions == 1
+
+
+def test_sqlite_result_cache(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+    values = {123: [1, 2, 3], -456: "ahoj", 1 << 100: np.arange(10)}
+    with cache.SQLiteResultCache(db_path, batch_size=2) as db_cache:
+        for h, val in values.items():
+            db_cache.insert(h, val)
+        # Pending and written values.
+        assert db_cache.value(123) == [1, 2, 3]
+        assert db_cache.value(1 << 100)[3] == 3
+        db_cache.insert(789, lambda x: x)
+        assert callable(db_cache.value(789))
+        # Shared by other connection once written.
+        with cache.SQLiteResultCache(db_path) as other:
+            assert other.value(123) == [1, 2, 3]
+            assert other.value(1 << 100) is cache.ResultCache.NoValue
+
+    with cache.SQLiteResultCache(db_path, max_age=3600) as db_cache:
+        assert len(db_cache) == 3
+        assert db_cache.value(-456) == "ahoj"
+        assert db_cache.value(789) is cache.ResultCache.NoValue
+        assert db_cache.expire() == 0
+        time.sleep(0.01)
+        assert db_cache.expire(max_age=0) == 3
+        assert db_cache.value(123) is cache.ResultCache.NoValue
+
+
+def test_tiered_result_cache(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+    with cache.SQLiteResultCache(db_path) as db_cache:
+        db_cache.insert(1, np.zeros(1000))
+    tiered = cache.TieredResultCache(cache.SQLiteResultCache(db_path), max_bytes=10000)
+    with tiered:
+        assert tiered.value(1).shape == (1000,)
+        # Promoted to the memory tier.
+        assert tiered.front.n_misses == 1
+        assert tiered.value(1).shape == (1000,)
+        assert tiered.front.n_hits == 1
+        tiered.insert(2, [1, 2])
+        assert tiered.front.value(2) == [1, 2]
+    with cache.SQLiteResultCache(db_path) as db_cache:
+        assert db_cache.value(2) == [1, 2]
+        # Closed cache is opened again.
+        db_cache.close()
+        assert db_cache.value(2) == [1, 2]